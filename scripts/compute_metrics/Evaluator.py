@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+from ultralytics import YOLO
+from .compute_f1_score import get_flag, get_GT, get_det, parse_result, compute_scores
+from .matching import MATCHING_METHODS
+from .PredictionCache import PredictionCache, BATCH_SIZE
+from ..utils.image_size import group_by_size
+
+
+class Evaluator:
+    def __init__(self, checkpoint, matching="greedy", cache_dir=None):
+        """
+        F1 score evaluator which loads the YOLO checkpoint once and keeps it for every image
+        
+        Args:
+            checkpoint (str): checkpoint path
+            matching (str): "greedy" or "hungarian", see `count_TP()` in ./compute_f1_score.py. Defaults to "greedy".
+            cache_dir (str): prediction cache directory, e.g. `PREDICTION_CACHE_DIR`. Defaults to None (no cache).
+                With a cache, the checkpoint is only loaded for the images that are not cached yet.
+        """
+        assert matching in MATCHING_METHODS, "Invalid matching"
+        
+        self.checkpoint = checkpoint
+        self.matching = matching
+        self.cache = None if cache_dir is None else PredictionCache(checkpoint, cache_dir)
+        self._model = None
+        self.flag = get_flag(self.model if self.cache is None else self.cache)  # "HBB" or "OBB"
+    
+    @property
+    def model(self):
+        if self.cache is not None:
+            return self.cache.model  # Lazily loaded
+        if self._model is None:
+            self._model = YOLO(self.checkpoint)
+        return self._model
+        
+    def evaluate(self, img_path, label_path, conf, iou_threshold) -> tuple[float, float, float]:
+        """
+        Same as `compute_f1_score(img_path, label_path, checkpoint, conf, iou_threshold)`, without reloading the checkpoint
+        
+        Args:
+            img_path (str): image path
+            label_path (str): .txt file path
+            conf (float): confidence cutoff
+            iou_threshold (float): IoU threshold
+        Returns:
+            (tuple): f1, precision, recall
+        """
+        GT, num_GT = get_GT(self.flag, img_path, label_path)
+        if self.cache is None:
+            det, num_det = get_det(self.flag, self.model, img_path, conf)
+        else:
+            det, num_det = parse_result(self.flag, next(self.cache.predict([img_path], conf)))
+        
+        return compute_scores(self.flag, det, num_det, GT, num_GT, iou_threshold, self.matching)
+    
+    def evaluate_batch(self, img_paths, label_paths, conf, iou_threshold, batch_size=BATCH_SIZE):
+        """
+        The model runs on `batch_size` images at a time and its results are streamed, so that memory stays bounded.
+        Images of different sizes are not batched together, so the detections are the same as `evaluate()` (see `group_by_size()`).
+        The GT of the next batch is read on a background thread while the model runs on the current one.
+        
+        Args:
+            img_paths (list): image paths
+            label_paths (list): .txt file paths, in the same order
+            conf (float): confidence cutoff
+            iou_threshold (float): IoU threshold
+            batch_size (int): number of images per inference batch. Defaults to BATCH_SIZE.
+        Yields:
+            (tuple): f1, precision, recall of each image, in the given order
+        """
+        for (GT, num_GT), result in self.stream(img_paths, label_paths, conf, batch_size):
+            det, num_det = parse_result(self.flag, result)
+            yield compute_scores(self.flag, det, num_det, GT, num_GT, iou_threshold, self.matching)
+    
+    def stream(self, img_paths, label_paths, conf, batch_size=BATCH_SIZE, **predict_kwargs):
+        """
+        Args:
+            img_paths (list): image paths
+            label_paths (list): .txt file paths, in the same order
+            conf (float): confidence cutoff
+            batch_size (int): number of images per inference batch. Defaults to BATCH_SIZE.
+            **predict_kwargs: other `model.predict()` settings, e.g. max_det
+        Yields:
+            (tuple): ((GT, num_GT), ultralytics Results or cached Prediction) of each image, in the given order
+        """
+        assert len(img_paths) == len(label_paths), "Unmatched images and labels"
+        assert batch_size > 0, "Invalid batch_size"
+        
+        batches = [slice(start, start + batch_size) for start in range(0, len(img_paths), batch_size)]
+        if not batches:
+            return
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_GTs = executor.submit(self._get_GTs, img_paths[batches[0]], label_paths[batches[0]])
+            
+            for i, batch in enumerate(batches):
+                GTs = next_GTs.result()
+                if i + 1 < len(batches):
+                    next_GTs = executor.submit(self._get_GTs, img_paths[batches[i + 1]], label_paths[batches[i + 1]])
+                
+                if self.cache is None:
+                    results = self._predict(list(img_paths[batch]), conf, **predict_kwargs)
+                else:
+                    results = self.cache.predict(img_paths[batch], conf, len(GTs), **predict_kwargs)
+                
+                yield from zip(GTs, results)
+    
+    def _predict(self, img_paths, conf, **predict_kwargs) -> list:
+        """Results of every image, in the given order, with one inference batch per image size"""
+        results = [None] * len(img_paths)
+        for group in group_by_size(img_paths):
+            group_results = self.model.predict(source=[img_paths[i] for i in group], conf=conf, batch=len(group), stream=True, verbose=False, **predict_kwargs)
+            for i, result in zip(group, group_results):
+                results[i] = result
+        return results
+    
+    def _get_GTs(self, img_paths, label_paths) -> list:
+        return [get_GT(self.flag, img_path, label_path) for img_path, label_path in zip(img_paths, label_paths)]
+
+
+def test(split_name="split1", mode="val", conf=0.25, num_images=8, cache_dir=None):
+    """Batched detections (`stream()`) must be the same as single-image ones (`get_det()`), on images of different sizes"""
+    import os
+    import torch
+    images_dir = f"data/splits/{split_name}/{mode}/images"
+    labels_dir = f"data/splits/{split_name}/{mode}/labels"
+    
+    # A few images of each size
+    filenames = sorted(os.listdir(images_dir))
+    img_paths = [f"{images_dir}/{filename}" for filename in filenames]
+    img_paths = [img_paths[i] for group in group_by_size(img_paths) for i in group[:max(1, num_images // 2)]][:num_images]
+    label_paths = [f"{labels_dir}/{os.path.basename(img_path)[:-4]}.txt" for img_path in img_paths]
+    if len(group_by_size(img_paths)) < 2:
+        print("==>> Only one image size, the letterbox of mixed-size batches is not tested")
+    
+    evaluator = Evaluator(f"checkpoints/{split_name}/best.pt", cache_dir=cache_dir)
+    model = YOLO(evaluator.checkpoint)
+    batched = [parse_result(evaluator.flag, result) for _, result in evaluator.stream(img_paths, label_paths, conf, batch_size=len(img_paths))]
+    
+    for img_path, (det, num_det) in zip(img_paths, batched):
+        single_det, single_num_det = get_det(evaluator.flag, model, img_path, conf)
+        assert num_det == single_num_det, f"{img_path}: {num_det} batched vs {single_num_det} single detections"
+        assert torch.allclose(det.float().cpu(), single_det.float().cpu(), atol=1e-2), f"{img_path}: different boxes"
+    print("All tests passed")
+
+
+if __name__ == "__main__":
+    test()
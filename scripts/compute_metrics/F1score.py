@@ -1,16 +1,38 @@
 import os
 from tqdm import tqdm
-from .compute_f1_score import compute_f1_score, save_as_excel
+from .compute_f1_score import save_as_excel
+from .Evaluator import Evaluator, BATCH_SIZE
+from .PredictionCache import PREDICTION_CACHE_DIR
 from .save_f1_score import save_f1_score
+from .confidence_sweep import CONF_FLOOR, CONF_GRID, IOU_GRID, collect_detections, sweep_entries, save_sweep_as_excel
+from .parallel_evaluation import evaluate_splits
+from .ResultsStore import ResultsStore, RESULTS_STORE_PATH
 
 class F1score:
-    def __init__(self, split_name, mode, conf, iou_threshold=0.1):
+    def __init__(self, split_name, mode, conf, iou_threshold=0.1, batch_size=BATCH_SIZE, matching="greedy", cache_dir=PREDICTION_CACHE_DIR, num_workers=1, store_path=RESULTS_STORE_PATH, export_xlsx=True):
         self.split_name = split_name
         self.mode = mode
         self.conf = conf
         self.iou_threshold = iou_threshold
+        self.batch_size = batch_size  # Number of images per inference batch
+        self.matching = matching  # "greedy" or "hungarian"
+        self.cache_dir = cache_dir  # Prediction cache, None to always run the model
+        self.num_workers = num_workers  # More than 1 to evaluate the images with a process pool, see ./parallel_evaluation.py
+        self.store_path = store_path  # Every run is appended here, see ./ResultsStore.py
+        self._store = None  # Opened on first use, see `store`
+        self.export_xlsx = export_xlsx  # Also write f1_score.xlsx
         self.xlsx_path = f'logs/{split_name}/{mode}/f1_score.xlsx'
         self.img_path = f'logs/{split_name}/{mode}/f1_score.png'
+        self.sweep_path = f'logs/{split_name}/{mode}/conf_sweep.xlsx'
+        self.checkpoint = f"checkpoints/{split_name}/best.pt"
+        self.evaluator = None  # Loaded on first use, then kept for every image
+        
+    @property
+    def store(self):
+        """The results store, only opened (and created) when results are saved or read"""
+        if self._store is None:
+            self._store = ResultsStore(self.store_path)
+        return self._store
         
     def compute_f1_score(self, save_history):
         history = dict()
@@ -20,32 +42,71 @@ class F1score:
         print(f"==>> F1score reading {images_dir} |||| {labels_dir}")
         print(f"==>> Saving history? {save_history}")
         
-        with tqdm(os.listdir(images_dir), desc="Evaluating") as pbar:
-            for filename in pbar:
-                # Configuration
-                img_path = f"{images_dir}/{filename}"
-                label_path = f"{labels_dir}/{filename[:-4]}.txt"
-                checkpoint = f"checkpoints/{self.split_name}/best.pt"
-
-                # Compute metrics
-                f1, precision, recall = compute_f1_score(img_path, label_path, checkpoint, self.conf, self.iou_threshold)
-
-                # Update progression bar
-                pbar.set_postfix({"F1": f"{f1:.2f}", "P": f"{precision:.2f}", "R": f"{recall:.2f}"})
-                
-                # Update history
-                history[filename] = (f1, precision, recall)
+        if self.num_workers > 1:
+            job = tuple([self.split_name, self.mode, self.conf, self.iou_threshold])
+            history = evaluate_splits([job], self.num_workers, self.batch_size, self.matching, self.cache_dir)[job[:2]]
+        else:
+            if self.evaluator is None:
+                self.evaluator = Evaluator(self.checkpoint, self.matching, self.cache_dir)
+            
+            filenames = os.listdir(images_dir)
+            img_paths = [f"{images_dir}/{filename}" for filename in filenames]
+            label_paths = [f"{labels_dir}/{filename[:-4]}.txt" for filename in filenames]
+            scores = self.evaluator.evaluate_batch(img_paths, label_paths, self.conf, self.iou_threshold, self.batch_size)
+            
+            with tqdm(zip(filenames, scores), total=len(filenames), desc="Evaluating") as pbar:
+                for filename, (f1, precision, recall) in pbar:
+                    # Update progression bar
+                    pbar.set_postfix({"F1": f"{f1:.2f}", "P": f"{precision:.2f}", "R": f"{recall:.2f}"})
+                    
+                    # Update history
+                    history[filename] = (f1, precision, recall)
 
         if save_history:
-            save_as_excel(history, self.xlsx_path)
+            self.save_history(history)
             
         print(f"==>> F1score finished computing F1 score")
         
+    def save_history(self, history):
+        """history = {filename: (f1, precision, recall)}"""
+        self.store.add(history, self.split_name, self.mode, self.conf, self.iou_threshold, self.checkpoint)
+        if self.export_xlsx:
+            save_as_excel(history, self.xlsx_path)
+        
     def save_f1_score(self):
-        save_f1_score(self.xlsx_path, self.img_path)
+        df = self.store.history(self.split_name, self.mode) if os.path.exists(self.store_path) else None  # Latest run
+        save_f1_score(self.xlsx_path, self.img_path, df if df is not None and len(df) else None)  # Falls back to the xlsx file
         print(f"==>> F1score finished saving F1 score")
 
     def compute_save_f1_score(self):
         self.compute_f1_score(save_history=True)
         self.save_f1_score()
-        
\ No newline at end of file
+        
+
+    def sweep_confidence(self, confs=CONF_GRID, iou_thresholds=IOU_GRID, conf_floor=CONF_FLOOR, save_history=True) -> dict:
+        """
+        Mean F1 score, Precision, Recall for a grid of confidence and IoU thresholds, from a single inference pass at `conf_floor`
+        
+        `self.conf` and `self.iou_threshold` are not used. Refer to ./confidence_sweep.py for the returned dict.
+        """
+        images_dir = f"data/splits/{self.split_name}/{self.mode}/images"
+        labels_dir = f"data/splits/{self.split_name}/{self.mode}/labels"
+        
+        print(f"==>> F1score sweeping confidence on {images_dir} |||| {labels_dir}")
+        
+        if self.evaluator is None:
+            self.evaluator = Evaluator(self.checkpoint, self.matching, self.cache_dir)
+        
+        filenames = os.listdir(images_dir)
+        img_paths = [f"{images_dir}/{filename}" for filename in filenames]
+        label_paths = [f"{labels_dir}/{filename[:-4]}.txt" for filename in filenames]
+        entries = collect_detections(self.evaluator, img_paths, label_paths, conf_floor, self.batch_size)
+        sweep = sweep_entries(entries, confs, iou_thresholds, self.matching)
+        
+        if save_history:
+            save_sweep_as_excel(sweep, self.sweep_path)
+        
+        for iou_threshold, conf in sweep["optimal_conf"].items():
+            print(f"==>> {self.split_name}/{self.mode} - IoU threshold {iou_threshold}: optimal conf {conf:.3f}")
+            
+        return sweep
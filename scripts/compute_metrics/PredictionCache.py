@@ -0,0 +1,172 @@
+"""
+F1score, predict_show and assess_result run the same checkpoints on the same images again and again.
+This cache keeps the raw predictions of each (checkpoint, image) pair as a compact .npz file:
+    - task: "detect" or "obb"
+    - xywh (N, 4) float32: box centers and sizes (OBB: without the angle)
+    - xyxyxyxy (N, 8) float32: box corners (HBB: the 4 corners of the box)
+    - conf (N,) float32: confidence scores, in decreasing order as returned by ultralytics
+
+An entry is keyed on the checkpoint content, the image content and the inference settings.
+Missing entries are predicted in batches of same-size images only, so that an entry holds the detections of a single-image predict.
+Predictions are made once at a low confidence floor, then any higher `conf` keeps the detections whose score is above it,
+which is what ultralytics would return for this `conf` (see ./confidence_sweep.py).
+The model is only loaded when an entry is missing.
+"""
+
+import os
+import hashlib
+from functools import lru_cache
+from collections import namedtuple
+import numpy as np
+from ultralytics import YOLO
+from ..utils.image_size import group_by_size
+
+PREDICTION_CACHE_DIR = "cache/predictions"
+BATCH_SIZE = 16
+CONF_FLOOR = 0.01
+MAX_DET = 1000  # ultralytics keeps 300 detections by default, which the confidence floor could exceed
+DEFAULT_MAX_DET = 300  # ultralytics default
+CACHE_VERSION = 2  # 1 could hold the detections of mixed-size batches, which are not reused
+
+Prediction = namedtuple("Prediction", ["task", "xywh", "xyxyxyxy", "conf"])
+
+
+class PredictionCache:
+    """on-disk cache of YOLO predictions for one checkpoint"""
+
+    def __init__(self, checkpoint, cache_dir=PREDICTION_CACHE_DIR, conf_floor=CONF_FLOOR, max_det=MAX_DET) -> None:
+        """
+        Args:
+            checkpoint (str): checkpoint path
+            cache_dir (str): cache directory. Defaults to PREDICTION_CACHE_DIR.
+            conf_floor (float): confidence of the cached predictions, the lowest `conf` that can be asked. Defaults to CONF_FLOOR.
+            max_det (int): maximum number of cached detections per image. Defaults to MAX_DET.
+        """
+        self.checkpoint = checkpoint
+        self.conf_floor = conf_floor
+        self.max_det = max_det
+        self._model = None
+
+        settings = f"conf{conf_floor}_maxdet{max_det}_v{CACHE_VERSION}"
+        self.cache_dir = f"{cache_dir}/{_hash_file(checkpoint)[:16]}/{settings}"
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def model(self):
+        """The YOLO model, only loaded when a prediction is missing"""
+        if self._model is None:
+            self._model = YOLO(self.checkpoint)
+        return self._model
+
+    @property
+    def task(self) -> str:
+        """Same as `YOLO(checkpoint).task`, without loading the model once it is known"""
+        task_path = f"{self.cache_dir}/task.txt"
+        if os.path.exists(task_path):
+            with open(task_path, "r") as f:
+                return f.read().strip()
+
+        task = self.model.task
+        tmp_path = f"{task_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(task)
+        os.replace(tmp_path, task_path)
+        return task
+
+    def predict(self, img_paths, conf, batch_size=BATCH_SIZE, max_det=DEFAULT_MAX_DET):
+        """
+        Same detections as `model.predict(source=img_path, conf=conf, max_det=max_det)` for every image
+
+        Args:
+            img_paths (list): image paths
+            conf (float): confidence cutoff, not below `self.conf_floor`
+            batch_size (int): number of images per inference batch, for the missing entries. Defaults to BATCH_SIZE.
+                A batch is split by image size, see `group_by_size()`.
+            max_det (int): maximum number of detections per image, not above `self.max_det`. Defaults to 300.
+        Yields:
+            Prediction: (task, xywh, xyxyxyxy, conf) of each image, in the given order
+        """
+        assert conf >= self.conf_floor, f"conf below the cached floor {self.conf_floor}"
+        assert max_det <= self.max_det, f"max_det above the cached {self.max_det}"
+
+        for start in range(0, len(img_paths), batch_size):
+            batch = list(img_paths[start:start + batch_size])
+            entry_paths = [self._entry_path(img_path) for img_path in batch]
+            predictions = [self._load(entry_path) for entry_path in entry_paths]
+
+            missing = [i for i, prediction in enumerate(predictions) if prediction is None]
+            for group in group_by_size([batch[i] for i in missing]):
+                group = [missing[k] for k in group]
+                results = self.model.predict(
+                    source=[batch[i] for i in group],
+                    conf=self.conf_floor,
+                    max_det=self.max_det,
+                    batch=len(group),
+                    stream=True,
+                    verbose=False,
+                )
+                for i, result in zip(group, results):
+                    predictions[i] = self._from_result(result)
+                    self._save(entry_paths[i], predictions[i])
+
+            for prediction in predictions:
+                yield self._filter(prediction, conf, max_det)
+
+    def _filter(self, prediction, conf, max_det) -> Prediction:
+        """Keep the detections whose score is above `conf`, compared in float32 like torch does"""
+        is_kept = np.flatnonzero(prediction.conf > np.float32(conf))[:max_det]
+        return Prediction(prediction.task, prediction.xywh[is_kept], prediction.xyxyxyxy[is_kept], prediction.conf[is_kept])
+
+    def _from_result(self, result) -> Prediction:
+        """ultralytics `Results` -> Prediction"""
+        if result.obb is not None:
+            xywh = result.obb.xywhr[:, :4].cpu().numpy()
+            xyxyxyxy = result.obb.xyxyxyxy.cpu().numpy().reshape(-1, 8)
+            conf = result.obb.conf.cpu().numpy()
+            task = "obb"
+        else:
+            xywh = result.boxes.xywh.cpu().numpy()
+            x1, y1, x2, y2 = result.boxes.xyxy.cpu().numpy().reshape(-1, 4).T
+            xyxyxyxy = np.stack([x1, y1, x2, y1, x2, y2, x1, y2], axis=1)
+            conf = result.boxes.conf.cpu().numpy()
+            task = "detect"
+
+        return Prediction(
+            task,
+            np.asarray(xywh, dtype=np.float32).reshape(-1, 4),
+            np.asarray(xyxyxyxy, dtype=np.float32).reshape(-1, 8),
+            np.asarray(conf, dtype=np.float32).reshape(-1),
+        )
+
+    def _entry_path(self, img_path) -> str:
+        name = os.path.basename(img_path).rsplit(".", 1)[0]
+        return f"{self.cache_dir}/{name}_{_hash_file(img_path)[:16]}.npz"
+
+    def _load(self, entry_path):
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with np.load(entry_path) as entry:
+                return Prediction(str(entry["task"]), entry["xywh"], entry["xyxyxyxy"], entry["conf"])
+        except (OSError, ValueError, KeyError):  # Corrupted entry
+            return None
+
+    def _save(self, entry_path, prediction) -> None:
+        """Write to a temporary file first so that concurrent readers never see a partial entry"""
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, task=np.array(prediction.task), xywh=prediction.xywh, xyxyxyxy=prediction.xyxyxyxy, conf=prediction.conf)
+        os.replace(tmp_path, entry_path)
+
+
+@lru_cache(maxsize=None)
+def _hash_file_stat(path, mtime_ns, size) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _hash_file(path) -> str:
+    """SHA-1 of the file content, computed once per process while the file keeps its mtime and size"""
+    stat = os.stat(path)
+    return _hash_file_stat(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
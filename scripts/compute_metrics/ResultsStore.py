@@ -0,0 +1,149 @@
+"""
+Every evaluation run is appended to one SQLite file (logs/results.sqlite), instead of being read back from one .xlsx file per split:
+    - runs: run_id, split, mode, conf, iou_threshold, checkpoint, created_at
+    - results: run_id, image, f1, precision, recall
+    - results_view: both joined, one row per image
+
+Queries return pandas DataFrames. An .xlsx file of a run can still be exported with `export_xlsx()`.
+"""
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+RESULTS_STORE_PATH = "logs/results.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    split TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    conf REAL,
+    iou_threshold REAL,
+    checkpoint TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    image TEXT NOT NULL,
+    f1 REAL,
+    precision REAL,
+    recall REAL
+);
+CREATE INDEX IF NOT EXISTS runs_split_mode ON runs (split, mode);
+CREATE INDEX IF NOT EXISTS results_run_id ON results (run_id);
+CREATE VIEW IF NOT EXISTS results_view AS
+    SELECT runs.run_id, split, mode, image, f1, precision, recall, conf, iou_threshold, checkpoint, created_at
+    FROM results JOIN runs USING (run_id);
+"""
+
+
+class ResultsStore:
+    """appendable store of per-image evaluation results"""
+
+    def __init__(self, path=RESULTS_STORE_PATH) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def add(self, history, split_name, mode, conf=None, iou_threshold=None, checkpoint=None) -> int:
+        """
+        Args:
+            history (dict): {image: (f1, precision, recall)}, as in `F1score`
+            split_name (str), mode (str), conf (float), iou_threshold (float), checkpoint (str): run settings
+
+        Returns:
+            int: run_id of the new run
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (split, mode, conf, iou_threshold, checkpoint, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (split_name, mode, conf, iou_threshold, checkpoint, datetime.now().isoformat(timespec="seconds")),
+            )
+            run_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO results (run_id, image, f1, precision, recall) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, image, float(f1), float(precision), float(recall)) for image, (f1, precision, recall) in history.items()],
+            )
+
+        print(f"==>> Saving run {run_id} ({split_name}/{mode}) to {self.path}")
+        return run_id
+
+    def runs(self, split_name=None, mode=None) -> pd.DataFrame:
+        """Every run, optionally of one split and/or mode, oldest first"""
+        query, params = "SELECT * FROM runs WHERE 1 = 1", list()
+        if split_name is not None:
+            query, params = query + " AND split = ?", params + [split_name]
+        if mode is not None:
+            query, params = query + " AND mode = ?", params + [mode]
+
+        with self._connect() as connection:
+            return pd.read_sql_query(query + " ORDER BY run_id", connection, params=params)
+
+    def latest_run_id(self, split_name, mode):
+        """run_id of the last run of this split and mode, or None"""
+        with self._connect() as connection:
+            row = connection.execute("SELECT MAX(run_id) FROM runs WHERE split = ? AND mode = ?", (split_name, mode)).fetchone()
+        return row[0]
+
+    def history(self, split_name, mode, run_id=None) -> pd.DataFrame:
+        """
+        Per-image results of one run, in the order they were evaluated
+
+        Args:
+            run_id (int, optional): Defaults to None (latest run of this split and mode).
+
+        Returns:
+            pd.DataFrame: columns image, f1, precision, recall. Empty if there is no such run.
+        """
+        run_id = self.latest_run_id(split_name, mode) if run_id is None else run_id
+
+        with self._connect() as connection:
+            return pd.read_sql_query(
+                "SELECT image, f1, precision, recall FROM results WHERE run_id = ? ORDER BY rowid",
+                connection,
+                params=[run_id],
+            )
+
+    def mean_metrics(self, split_names, mode) -> pd.DataFrame:
+        """
+        Mean f1, precision, recall of the latest run of each split, in one query
+
+        Returns:
+            pd.DataFrame: indexed by split, in the order of `split_names`. Splits without a run are missing.
+        """
+        placeholders = ", ".join("?" * len(split_names))
+        query = f"""
+            SELECT split, AVG(f1) AS f1, AVG(precision) AS precision, AVG(recall) AS recall
+            FROM results_view
+            WHERE run_id IN (SELECT MAX(run_id) FROM runs WHERE mode = ? AND split IN ({placeholders}) GROUP BY split)
+            GROUP BY split
+        """
+        with self._connect() as connection:
+            df = pd.read_sql_query(query, connection, params=[mode, *split_names])
+
+        df = df.set_index("split")
+        return df.reindex([split_name for split_name in split_names if split_name in df.index])
+
+    def export_xlsx(self, split_name, mode, save_path, run_id=None) -> None:
+        """Same .xlsx file as `save_as_excel()`"""
+        df = self.history(split_name, mode, run_id).set_index("image")
+        df.index.name = None
+        if os.path.exists(save_path):
+            os.remove(save_path)
+        print(f"==>> Saving {save_path}")
+        df.to_excel(save_path)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60)  # Parallel runs may write at the same time
+        try:
+            with connection:  # Commit, or roll back on error
+                yield connection
+        finally:
+            connection.close()
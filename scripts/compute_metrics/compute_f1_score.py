@@ -1,16 +1,23 @@
 import os
+import numpy as np
 import torch
-from PIL import Image
 from ultralytics import YOLO
 import pandas as pd
 from tqdm import tqdm
 from shapely.geometry import Polygon
+from .iou_matrix import hbb_iou_matrix, obb_iou_matrix
+from .matching import MATCHING_METHODS, greedy_matching, hungarian_matching
+from .PredictionCache import Prediction
+from ..utils.read_labels import read_labels
+from ..utils.image_size import image_size
 
 
 def compute_f1_score(img_path, label_path, checkpoint, conf, iou_threshold) -> tuple[float, float, float]:
     """
     Method: If the IoU between the predicted and true junctions is greater than a threshold, it is a true positive.
     
+    NOTE: This loads the checkpoint at every call. To evaluate many images, use `Evaluator` (./Evaluator.py) which loads it once.
+    
     Args:
         img_path (str): image path
         label_path (str): .txt file path
@@ -22,7 +29,17 @@ def compute_f1_score(img_path, label_path, checkpoint, conf, iou_threshold) -> t
     """
     # Load model and get task
     model = YOLO(checkpoint)
+    flag = get_flag(model)
+
+    # Retrieving ground truth (GT) and detection (det)
+    GT, num_GT = get_GT(flag, img_path, label_path)
+    det, num_det = get_det(flag, model, img_path, conf)
     
+    return compute_scores(flag, det, num_det, GT, num_GT, iou_threshold)
+
+
+def get_flag(model) -> str:
+    """YOLO model's task -> "HBB" or "OBB" """
     if model.task == "detect":
         flag = "HBB"
     elif model.task == "obb":
@@ -32,142 +49,147 @@ def compute_f1_score(img_path, label_path, checkpoint, conf, iou_threshold) -> t
     else:
         raise Exception("Unexpected YOLO model's task.")
     
-    # Functions with behaviors based on flags
-    def get_GT(flag, label_path) -> tuple[torch.Tensor, int]:
-        width, height = Image.open(img_path).size
+    return flag
+
+
+def get_GT(flag, img_path, label_path) -> tuple[torch.Tensor, int]:
+    """
+    Returns:
+        (tuple): GT boxes in absolute values, (num_GT, 4) for HBB or (num_GT, 8) for OBB, and num_GT
+    """
+    width, height = image_size(img_path, exif_transpose=False)  # Header only, same as PIL's Image.size
+    
+    labels = read_labels(label_path, flag)  # (num_GT, 5) or (num_GT, 9), class index first
+    boxes_n = torch.from_numpy(labels[:, 1:].astype(np.float32))  # x, y is center point for HBB
+    num_GT = boxes_n.size()[0]  # Number of GT junctions
+    boxes = boxes_n * torch.tensor([width, height] * (boxes_n.size()[1] // 2))
+    GT = tuple([boxes, num_GT])
         
-        if flag == "HBB":
-            xywhn_GT = list()
-            with open(label_path, "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    info = line.split(" ")
-                    x, y, w, h = float(info[1]), float(info[2]), float(info[3]), float(info[4])  # x, y is center point
-                    xywhn_GT.append([x, y, w, h])
-            
-            xywhn_GT = torch.tensor(xywhn_GT)  # Turn into a 2D Tensor of shape (num_GT, 4)
-            num_GT = xywhn_GT.size()[0]  # Number of GT junctions
-            xywh_GT = xywhn_GT * torch.tensor([width, height, width, height])
-            GT = tuple([xywh_GT, num_GT])
-        else:
-            xyxyxyxyn_GT = list()
-            with open(label_path, "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    info = line.split(" ")
-                    x1, y1 = float(info[1]), float(info[2])
-                    x2, y2 = float(info[3]), float(info[4])
-                    x3, y3 = float(info[5]), float(info[6])
-                    x4, y4 = float(info[7]), float(info[8])
-                    xyxyxyxyn_GT.append([x1, y1, x2, y2, x3, y3, x4, y4])
-            
-            xyxyxyxyn_GT = torch.tensor(xyxyxyxyn_GT)
-            num_GT = xyxyxyxyn_GT.size()[0]  # Number of GT junctions
-            xyxyxyxy_GT = xyxyxyxyn_GT * torch.tensor([width, height, width, height, width, height, width, height])
-            GT = tuple([xyxyxyxy_GT, num_GT])
-            
-        return GT
-            
-    def get_det(flag) -> tuple[torch.Tensor, int]:
-        results = model.predict(source=img_path, conf=conf)
-        if flag == "HBB":
-            boxes = results[0].boxes
-            xywh_det = boxes.xywh  # x, y is center point
-            num_det = xywh_det.size()[0]  # Number of detected junctions
-            det = tuple([xywh_det, num_det])
-        else:
-            obb = results[0].obb
-            xyxyxyxy_det = obb.xyxyxyxy
-            xyxyxyxy_det = torch.flatten(xyxyxyxy_det, start_dim=1, end_dim=-1)  # (num_det, num_obb, num_coord) -> (num_det, num_obb*num_coord)
-            num_det = xyxyxyxy_det.size()[0]  # Number of detected junctions
-            det = tuple([xyxyxyxy_det, num_det])
-            
-        return det
+    return GT
+
+
+def get_det(flag, model, img_path, conf) -> tuple[torch.Tensor, int]:
+    results = model.predict(source=img_path, conf=conf)
+    return parse_result(flag, results[0])
+
+
+def parse_result(flag, result) -> tuple[torch.Tensor, int]:
+    """One ultralytics `Results` or cached `Prediction` (./PredictionCache.py) -> (det, num_det)"""
+    if isinstance(result, Prediction):
+        det = torch.from_numpy(result.xywh if flag == "HBB" else result.xyxyxyxy)
+        num_det = det.size()[0]  # Number of detected junctions
+        det = tuple([det, num_det])
+    elif flag == "HBB":
+        boxes = result.boxes
+        xywh_det = boxes.xywh  # x, y is center point
+        num_det = xywh_det.size()[0]  # Number of detected junctions
+        det = tuple([xywh_det, num_det])
+    else:
+        obb = result.obb
+        xyxyxyxy_det = obb.xyxyxyxy
+        xyxyxyxy_det = torch.flatten(xyxyxyxy_det, start_dim=1, end_dim=-1)  # (num_det, num_obb, num_coord) -> (num_det, num_obb*num_coord)
+        num_det = xyxyxyxy_det.size()[0]  # Number of detected junctions
+        det = tuple([xyxyxyxy_det, num_det])
         
-    def get_IOU(flag, box1, box2):
-        if flag == "HBB":
-            """Box format: (x_center, y_center, w, h) -> absolute values, not normalized"""
-            x1, y1, w1, h1 = box1
-            x2, y2, w2, h2 = box2
-
-            # Convert (x_center, y_center, w, h) to (x_min, y_min, x_max, y_max)
-            x1_min, y1_min = x1 - w1 / 2, y1 - h1 / 2
-            x1_max, y1_max = x1 + w1 / 2, y1 + h1 / 2
-            x2_min, y2_min = x2 - w2 / 2, y2 - h2 / 2
-            x2_max, y2_max = x2 + w2 / 2, y2 + h2 / 2
-
-            # Get intersection corners
-            xi1 = max(x1_min, x2_min)
-            yi1 = max(y1_min, y2_min)
-            xi2 = min(x1_max, x2_max)
-            yi2 = min(y1_max, y2_max)
-            
-            # Compute IOU
-            inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-            box1_area = w1 * h1
-            box2_area = w2 * h2
-            union_area = box1_area + box2_area - inter_area
-            IOU = inter_area / union_area
-        else:
-            """Box format: (x1, y1, x2, y2, x3, y3, x4, y4) -> absolute values, not normalized"""
-            # Create Polygon()
-            poly1 = Polygon([(box1[0], box1[1]), (box1[2], box1[3]), (box1[4], box1[5]), (box1[6], box1[7])])
-            poly2 = Polygon([(box2[0], box2[1]), (box2[2], box2[3]), (box2[4], box2[5]), (box2[6], box2[7])])
-            
-            # Compute IOU
-            inter_area = poly1.intersection(poly2).area
-            union_area = poly1.area + poly2.area - inter_area
-            IOU = inter_area / union_area
-            
-        return IOU
+    return det
+    
+
+def get_scores(flag, result) -> torch.Tensor:
+    """One ultralytics `Results` or cached `Prediction` -> (num_det,) confidence scores, in the same order as `parse_result()`"""
+    if isinstance(result, Prediction):
+        return torch.from_numpy(result.conf)
+    return result.boxes.conf if flag == "HBB" else result.obb.conf
+
+
+def get_IOU(flag, box1, box2):
+    if flag == "HBB":
+        """Box format: (x_center, y_center, w, h) -> absolute values, not normalized"""
+        x1, y1, w1, h1 = box1
+        x2, y2, w2, h2 = box2
+
+        # Convert (x_center, y_center, w, h) to (x_min, y_min, x_max, y_max)
+        x1_min, y1_min = x1 - w1 / 2, y1 - h1 / 2
+        x1_max, y1_max = x1 + w1 / 2, y1 + h1 / 2
+        x2_min, y2_min = x2 - w2 / 2, y2 - h2 / 2
+        x2_max, y2_max = x2 + w2 / 2, y2 + h2 / 2
+
+        # Get intersection corners
+        xi1 = max(x1_min, x2_min)
+        yi1 = max(y1_min, y2_min)
+        xi2 = min(x1_max, x2_max)
+        yi2 = min(y1_max, y2_max)
         
-    def get_IOU_matrix(flag, det, GT):
-        """Row represents detected boxes, column represents GT boxes"""
-        num_det = det.size()[0]
-        num_GT = GT.size()[0]
-        iou_matrix = torch.zeros((num_det, num_GT))
+        # Compute IOU
+        inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
+        box1_area = w1 * h1
+        box2_area = w2 * h2
+        union_area = box1_area + box2_area - inter_area
+        IOU = inter_area / union_area
+    else:
+        """Box format: (x1, y1, x2, y2, x3, y3, x4, y4) -> absolute values, not normalized"""
+        # Create Polygon()
+        poly1 = Polygon([(box1[0], box1[1]), (box1[2], box1[3]), (box1[4], box1[5]), (box1[6], box1[7])])
+        poly2 = Polygon([(box2[0], box2[1]), (box2[2], box2[3]), (box2[4], box2[5]), (box2[6], box2[7])])
         
-        for i in range(num_det):
-            for j in range(num_GT):
-                iou_matrix[i, j] = get_IOU(flag, det[i], GT[j])
+        # Compute IOU
+        inter_area = poly1.intersection(poly2).area
+        union_area = poly1.area + poly2.area - inter_area
+        IOU = inter_area / union_area
         
-        return iou_matrix
+    return IOU
+    
 
-    # Retrieving ground truth (GT) and detection (det)
-    GT, num_GT = get_GT(flag, label_path)
-    det, num_det = get_det(flag)
-    
-    # ========================================================================================================================= #
-    #   Computing F1, Pr, Rc                                                                                                    #
-    #                                                                                                                           #
-    #   Motivation (Idea explanation):                                                                                          #
-    #       - We create a matrix of IoU between the *detected* and *true* junctions.                                            #
-    #       - We count up the TP by 1 if argmax(*detected*) is *true* and argmax(*true*) is *detected*                          #
-    #           (because sometimes multiple detections can have high IoU with the same *true* box)                              #
-    #       - *Detected* bounding boxes whose IoU with a matched *true* box is high but couldn't find a match is counted as FP  #
-    # ========================================================================================================================= #
+def get_IOU_matrix(flag, det, GT):
+    """
+    Row represents detected boxes, column represents GT boxes
     
-    iou_matrix = get_IOU_matrix(flag, det, GT)  # Shape: (num_det, num_GT)
+    Same values as `get_IOU()` on every pair, computed at once (see ./iou_matrix.py)
+    """
+    if flag == "HBB":
+        iou_matrix = hbb_iou_matrix(det, GT)
+    else:
+        iou_matrix = obb_iou_matrix(det, GT)
     
-    TP = 0
+    return iou_matrix
+
+
+def count_TP(iou_matrix, iou_threshold, matching="greedy") -> int:
+    """
+    Motivation (Idea explanation):
+        - We create a matrix of IoU between the *detected* and *true* junctions.
+        - We count up the TP by 1 if argmax(*detected*) is *true* and argmax(*true*) is *detected*
+            (because sometimes multiple detections can have high IoU with the same *true* box)
+        - *Detected* bounding boxes whose IoU with a matched *true* box is high but couldn't find a match is counted as FP
     
-    for idx, det_iou in enumerate(iou_matrix):
-        det_iou[(det_iou < iou_threshold)] = 0.  # In a row, every IOU below the threshold is zeroed.
-        
-        while True:
-            max_iou_idx = torch.argmax(det_iou)  # Get the column index where IOU is max
-            
-            if det_iou[max_iou_idx] == 0:  # If the max IOU is 0, skip this detection
-                break
-            
-            if torch.argmax(iou_matrix[:, max_iou_idx]) == idx:  # If the current column (max_iou_idx) has the current row (idx) as the max IOU
-                TP += 1  # Count this IOU as 1 True Positive
-                iou_matrix[idx, :] = -1  # Eliminate the current row (detection) from further examination
-                iou_matrix[:, max_iou_idx] = -1  # Eliminate the found column (GT) from further examination
-                break
-            else:
-                det_iou[max_iou_idx] = 0.
+    Args:
+        iou_matrix (torch.Tensor): (num_det, num_GT)
+        iou_threshold (float): IoU threshold
+        matching (str): "greedy" (the rule above) or "hungarian" (optimal one-to-one matching), see ./matching.py
+    """
+    assert matching in MATCHING_METHODS, "Invalid matching"
     
+    iou_matrix = iou_matrix.detach().cpu().numpy()
+    
+    if matching == "greedy":
+        matches = greedy_matching(iou_matrix, iou_threshold)
+    else:
+        matches = hungarian_matching(iou_matrix, iou_threshold)
+    
+    TP = len(matches)
+    
+    return TP
+
+
+def compute_scores(flag, det, num_det, GT, num_GT, iou_threshold, matching="greedy") -> tuple[float, float, float]:
+    """
+    Args:
+        matching (str): "greedy" or "hungarian", see `count_TP()`
+    Returns:
+        (tuple): f1, precision, recall
+    """
+    iou_matrix = get_IOU_matrix(flag, det, GT)  # Shape: (num_det, num_GT)
+    
+    TP = count_TP(iou_matrix, iou_threshold, matching)
     FP = num_det - TP
     FN = num_GT - TP
     
@@ -178,6 +200,20 @@ def compute_f1_score(img_path, label_path, checkpoint, conf, iou_threshold) -> t
     return f1, precision, recall
 
 
+def compute_scores_from_counts(TP, num_det, num_GT) -> tuple[float, float, float]:
+    """
+    Same as the end of `compute_scores()`, but 0 instead of a ZeroDivisionError when there is no detection or no GT
+    
+    Returns:
+        (tuple): f1, precision, recall
+    """
+    precision = TP / num_det if num_det else 0.
+    recall = TP / num_GT if num_GT else 0.
+    f1 = 2 * (precision * recall) / (precision + recall) if precision + recall else 0.
+    
+    return f1, precision, recall
+
+
 def save_as_excel(history, save_path):
     if os.path.exists(save_path):
         os.remove(save_path)
@@ -196,37 +232,33 @@ if __name__ == "__main__":
     images_folder = f"data/splits/{split_name}/{mode}/images"
     labels_folder = f"data/splits/{split_name}/{mode}/labels"
     
-    with tqdm(os.listdir(images_folder), desc="Evaluating") as pbar:
-        for filename in pbar:
-            # Configuration
-            img_path = f"{images_folder}/{filename}"
-            label_path = f"{labels_folder}/{filename[:-4]}.txt"
-            checkpoint = f"checkpoints/{split_name}/best.pt"
-            
-            conf = 0.376  # Change this if needed
-            # ============================================================================================================= #
-            # IoU Threshold should be small because, from experience, iou != 0. means valid prediction.                     #
-            # Why small iou means valid prediction? Because some true boxes were not acutely correctly labeled.             #
-            # One more thing, for small object detection (SOD), small IoU doesn't necessarily mean false prediction [1].    #
-            # ============================================================================================================= #
-            iou_threshold = 0.1  # Change this if needed
-
-            # Compute metrics
-            f1, precision, recall = compute_f1_score(
-                img_path=img_path, 
-                label_path=label_path,
-                checkpoint=checkpoint, 
-                conf=conf, 
-                iou_threshold=iou_threshold
-            )
-
+    checkpoint = f"checkpoints/{split_name}/best.pt"
+    conf = 0.376  # Change this if needed
+    # ============================================================================================================= #
+    # IoU Threshold should be small because, from experience, iou != 0. means valid prediction.                     #
+    # Why small iou means valid prediction? Because some true boxes were not acutely correctly labeled.             #
+    # One more thing, for small object detection (SOD), small IoU doesn't necessarily mean false prediction [1].    #
+    # ============================================================================================================= #
+    iou_threshold = 0.1  # Change this if needed
+    
+    batch_size = 16  # Change this if needed
+    
+    from .Evaluator import Evaluator
+    from .PredictionCache import PREDICTION_CACHE_DIR
+    evaluator = Evaluator(checkpoint, cache_dir=PREDICTION_CACHE_DIR)  # The checkpoint is loaded at most once for the whole folder
+    
+    filenames = os.listdir(images_folder)
+    img_paths = [f"{images_folder}/{filename}" for filename in filenames]
+    label_paths = [f"{labels_folder}/{filename[:-4]}.txt" for filename in filenames]
+    scores = evaluator.evaluate_batch(img_paths, label_paths, conf, iou_threshold, batch_size)
+    
+    with tqdm(zip(filenames, scores), total=len(filenames), desc="Evaluating") as pbar:
+        for filename, (f1, precision, recall) in pbar:
             # Update progression bar
             pbar.set_postfix({"F1": f"{f1:.2f}", "P": f"{precision:.2f}", "R": f"{recall:.2f}"})
             
             # Update history
             history[filename] = (f1, precision, recall)
-
-            # break  # Comment out if needed
     
     if save_history:
         save_as_excel(history, save_path)
@@ -0,0 +1,105 @@
+"""
+Confidence threshold sweep from a single inference pass
+
+The model runs once per image at a low confidence floor, and its raw detections are kept with their scores.
+Running the model again with a higher `conf` gives the same detections as keeping those whose score is above it
+(ultralytics keeps `score > conf`, and NMS only suppresses a box with a higher-scored one),
+so any (conf, IoU threshold) pair above the floor can be scored from this cache, without the model.
+"""
+
+import numpy as np
+import pandas as pd
+from .PredictionCache import BATCH_SIZE, CONF_FLOOR, MAX_DET
+from .compute_f1_score import parse_result, get_scores, get_IOU_matrix, compute_scores_from_counts
+from .matching import MATCHING_METHODS, greedy_matching, hungarian_matching
+
+CONF_GRID = np.round(np.arange(0.05, 0.951, 0.001), 3)
+IOU_GRID = np.round(np.arange(0.1, 0.51, 0.1), 1)
+
+
+def collect_detections(evaluator, img_paths, label_paths, conf_floor=CONF_FLOOR, batch_size=BATCH_SIZE, max_det=MAX_DET) -> list:
+    """
+    Run the model once on every image at `conf_floor`
+
+    Args:
+        evaluator (Evaluator): evaluator holding the checkpoint
+        img_paths (list): image paths
+        label_paths (list): .txt file paths, in the same order
+        conf_floor (float): lowest confidence that can be swept. Defaults to CONF_FLOOR.
+        batch_size (int): number of images per inference batch. Defaults to BATCH_SIZE.
+        max_det (int): maximum number of detections per image. Defaults to MAX_DET.
+    Returns:
+        list: [(iou_matrix (num_det, num_GT), scores (num_det,), num_GT), ...] of each image, in the given order
+    """
+    entries = list()
+
+    for (GT, num_GT), result in evaluator.stream(img_paths, label_paths, conf_floor, batch_size, max_det=max_det):
+        det, _ = parse_result(evaluator.flag, result)
+        iou_matrix = get_IOU_matrix(evaluator.flag, det, GT).numpy()
+        scores = get_scores(evaluator.flag, result).detach().cpu().numpy()
+        entries.append(tuple([iou_matrix, scores, num_GT]))
+
+    return entries
+
+
+def sweep_entries(entries, confs=CONF_GRID, iou_thresholds=IOU_GRID, matching="greedy") -> dict:
+    """
+    Args:
+        entries (list): output of `collect_detections()`
+        confs (array-like): confidence thresholds, not below the floor used in `collect_detections()`
+        iou_thresholds (array-like): IoU thresholds
+        matching (str): "greedy" or "hungarian", see ./matching.py
+    Returns:
+        dict: {
+            "conf": (num_conf,), "iou_threshold": (num_iou,),
+            "f1", "precision", "recall": (num_conf, num_iou) means over the images,
+            "optimal_conf": {iou_threshold: conf with the highest mean f1}
+        }
+    """
+    assert matching in MATCHING_METHODS, "Invalid matching"
+    match = greedy_matching if matching == "greedy" else hungarian_matching
+
+    confs = np.asarray(confs, dtype=np.float64)
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    totals = np.zeros((3, len(confs), len(iou_thresholds)))  # f1, precision, recall
+
+    for iou_matrix, scores, num_GT in entries:
+        thresholds = confs.astype(scores.dtype)  # Compared in the score precision, like torch does
+        
+        # The kept detections only change when a conf passes a score, so each distinct set is scored once
+        num_kept = len(scores) - np.searchsorted(np.sort(scores), thresholds, side="right")
+
+        for n in np.unique(num_kept):
+            is_kept = num_kept == n
+            rows = iou_matrix[scores > thresholds[is_kept][0]]  # Detections keep their order
+            for k, iou_threshold in enumerate(iou_thresholds):
+                TP = len(match(rows, iou_threshold))
+                totals[:, is_kept, k] += np.array(compute_scores_from_counts(TP, n, num_GT))[:, None]
+
+    f1, precision, recall = totals / max(len(entries), 1)
+    optimal_conf = {
+        float(iou_threshold): float(confs[np.argmax(f1[:, k])]) for k, iou_threshold in enumerate(iou_thresholds)
+    }
+
+    return {
+        "conf": confs,
+        "iou_threshold": iou_thresholds,
+        "f1": f1,
+        "precision": precision,
+        "recall": recall,
+        "optimal_conf": optimal_conf,
+    }
+
+
+def save_sweep_as_excel(sweep, save_path) -> None:
+    """One row per (conf, iou_threshold)"""
+    conf, iou_threshold = np.meshgrid(sweep["conf"], sweep["iou_threshold"], indexing="ij")
+    df = pd.DataFrame({
+        "conf": conf.ravel(),
+        "iou_threshold": iou_threshold.ravel(),
+        "f1": sweep["f1"].ravel(),
+        "precision": sweep["precision"].ravel(),
+        "recall": sweep["recall"].ravel(),
+    })
+    print(f"==>> Saving {save_path}")
+    df.to_excel(save_path, index=False)
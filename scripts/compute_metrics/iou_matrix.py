@@ -0,0 +1,163 @@
+"""
+IoU between every detected box and every GT box at once, used by `get_IOU_matrix()` in ./compute_f1_score.py
+Row represents detected boxes, column represents GT boxes.
+"""
+
+import numpy as np
+import torch
+from scipy.spatial import cKDTree
+
+
+def hbb_iou_matrix(det, GT) -> torch.Tensor:
+    """
+    Same values as `get_IOU("HBB", det[i], GT[j])` for every pair, broadcasting (num_det, 1) against (1, num_GT)
+    
+    Args:
+        det (torch.Tensor): (num_det, 4) detected boxes
+        GT (torch.Tensor): (num_GT, 4) GT boxes
+            Box format: (x_center, y_center, w, h) -> absolute values, not normalized
+    Returns:
+        torch.Tensor: (num_det, num_GT) float32 IoU matrix
+    """
+    det = det.detach().cpu().float().reshape(-1, 4)
+    GT = GT.detach().cpu().float().reshape(-1, 4)
+    
+    x1, y1, w1, h1 = det[:, None, :].unbind(dim=-1)  # (num_det, 1) each
+    x2, y2, w2, h2 = GT[None, :, :].unbind(dim=-1)  # (1, num_GT) each
+    
+    # Convert (x_center, y_center, w, h) to (x_min, y_min, x_max, y_max)
+    x1_min, y1_min = x1 - w1 / 2, y1 - h1 / 2
+    x1_max, y1_max = x1 + w1 / 2, y1 + h1 / 2
+    x2_min, y2_min = x2 - w2 / 2, y2 - h2 / 2
+    x2_max, y2_max = x2 + w2 / 2, y2 + h2 / 2
+    
+    # Get intersection corners
+    xi1 = torch.maximum(x1_min, x2_min)
+    yi1 = torch.maximum(y1_min, y2_min)
+    xi2 = torch.minimum(x1_max, x2_max)
+    yi2 = torch.minimum(y1_max, y2_max)
+    
+    # Compute IOU
+    inter_area = (xi2 - xi1).clamp(min=0) * (yi2 - yi1).clamp(min=0)
+    box1_area = w1 * h1
+    box2_area = w2 * h2
+    union_area = box1_area + box2_area - inter_area
+    iou_matrix = inter_area / union_area
+    
+    return iou_matrix
+
+
+def obb_iou_matrix(det, GT) -> torch.Tensor:
+    """
+    Same values as `get_IOU("OBB", det[i], GT[j])` for every pair, without a shapely Polygon per pair
+    
+    Junction boxes are tiny compared to the image, so most pairs are far apart and their IoU is 0:
+        (1) Pairs whose circumscribed circles do not touch are skipped, using a KD-tree on the box centers.
+        (2) The intersection of the remaining pairs is computed at once by convex polygon clipping, in float64.
+    
+    Args:
+        det (torch.Tensor): (num_det, 8) detected boxes
+        GT (torch.Tensor): (num_GT, 8) GT boxes
+            Box format: (x1, y1, x2, y2, x3, y3, x4, y4) -> absolute values, not normalized
+    Returns:
+        torch.Tensor: (num_det, num_GT) float32 IoU matrix
+    """
+    det = det.detach().cpu().double().numpy().reshape(-1, 4, 2)
+    GT = GT.detach().cpu().double().numpy().reshape(-1, 4, 2)
+    
+    return torch.from_numpy(_obb_iou_matrix(det, GT)).float()
+
+
+def _obb_iou_matrix(det, GT) -> np.ndarray:
+    """(num_det, 4, 2) x (num_GT, 4, 2) corners -> (num_det, num_GT) float64 IoU matrix"""
+    iou_matrix = np.zeros((len(det), len(GT)))
+    if len(det) == 0 or len(GT) == 0:
+        return iou_matrix
+    
+    # (1) Circumscribed circles
+    det_centers, GT_centers = det.mean(axis=1), GT.mean(axis=1)
+    det_radii = np.linalg.norm(det - det_centers[:, None], axis=-1).max(axis=1)
+    GT_radii = np.linalg.norm(GT - GT_centers[:, None], axis=-1).max(axis=1)
+    
+    candidates = cKDTree(GT_centers).query_ball_point(det_centers, r=det_radii + GT_radii.max())
+    rows = np.repeat(np.arange(len(det)), [len(candidate) for candidate in candidates])
+    cols = np.concatenate(candidates).astype(np.int64)
+    is_touching = np.linalg.norm(det_centers[rows] - GT_centers[cols], axis=1) <= det_radii[rows] + GT_radii[cols]
+    rows, cols = rows[is_touching], cols[is_touching]
+    if len(rows) == 0:
+        return iou_matrix
+    
+    # (2) Convex polygon clipping
+    inter_area = _intersection_area(det[rows], GT[cols])
+    det_area, GT_area = _polygon_area(det), _polygon_area(GT)
+    union_area = det_area[rows] + GT_area[cols] - inter_area
+    iou_matrix[rows, cols] = inter_area / union_area
+    
+    return iou_matrix
+
+
+def _intersection_area(poly1, poly2) -> np.ndarray:
+    """
+    Intersection area of M pairs of convex quadrilaterals, with either vertex orientation
+    
+    The intersection polygon is made of the corners of each box that lie inside the other box and of the edge-edge intersections.
+    Its vertices are sorted by angle around their centroid, then the area is computed with the shoelace formula.
+    
+    Args:
+        poly1, poly2 (np.ndarray): (M, 4, 2) corners
+    Returns:
+        np.ndarray: (M,) intersection areas
+    """
+    eps = 1e-9 * max(np.abs(poly1).max(), np.abs(poly2).max(), 1.)
+    
+    # Corners inside the other box: (M, 4) each
+    inside1 = _is_inside(poly1, poly2, eps)
+    inside2 = _is_inside(poly2, poly1, eps)
+    
+    # Edge-edge intersections: edge a of poly1 against edge b of poly2, (M, 4, 4)
+    p, r = poly1[:, :, None], (np.roll(poly1, -1, axis=1) - poly1)[:, :, None]  # (M, 4, 1, 2)
+    q, s = poly2[:, None], (np.roll(poly2, -1, axis=1) - poly2)[:, None]  # (M, 1, 4, 2)
+    denom = _cross(r, s)
+    is_parallel = np.abs(denom) <= eps * eps
+    denom = np.where(is_parallel, 1., denom)
+    t = _cross(q - p, s) / denom
+    u = _cross(q - p, r) / denom
+    crossing = ~is_parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    crossing_points = p + t[..., None] * r  # (M, 4, 4, 2)
+    
+    # (M, 24, 2) candidate vertices and their validity
+    points = np.concatenate([poly1, poly2, crossing_points.reshape(-1, 16, 2)], axis=1)
+    is_valid = np.concatenate([inside1, inside2, crossing.reshape(-1, 16)], axis=1)
+    num_valid = is_valid.sum(axis=1)
+    
+    # Sort the valid vertices by angle around their centroid, invalid ones last
+    centroid = (points * is_valid[..., None]).sum(axis=1) / np.maximum(num_valid, 1)[:, None]
+    offset = points - centroid[:, None]
+    angle = np.where(is_valid, np.arctan2(offset[..., 1], offset[..., 0]), np.inf)
+    order = np.argsort(angle, axis=1, kind="stable")
+    points = np.take_along_axis(points, order[..., None], axis=1)
+    is_valid = np.take_along_axis(is_valid, order, axis=1)
+    
+    # Invalid vertices repeat the first valid one, they add no area
+    points = np.where(is_valid[..., None], points, points[:, :1])
+    area = _polygon_area(points)
+    
+    return np.where(num_valid >= 3, area, 0.)
+
+
+def _is_inside(points, poly, eps) -> np.ndarray:
+    """(M, K, 2) points and (M, 4, 2) convex polygons -> (M, K) bool, boundary included"""
+    edges = np.roll(poly, -1, axis=1) - poly  # (M, 4, 2)
+    side = _cross(edges[:, None], points[:, :, None] - poly[:, None])  # (M, K, 4)
+    return np.all(side >= -eps, axis=-1) | np.all(side <= eps, axis=-1)
+
+
+def _polygon_area(poly) -> np.ndarray:
+    """(M, K, 2) polygons -> (M,) areas, shoelace formula"""
+    x, y = poly[..., 0], poly[..., 1]
+    return np.abs((x * np.roll(y, -1, axis=-1) - np.roll(x, -1, axis=-1) * y).sum(axis=-1)) / 2
+
+
+def _cross(a, b) -> np.ndarray:
+    """2D cross product over the last axis"""
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
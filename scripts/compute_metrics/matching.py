@@ -0,0 +1,86 @@
+"""
+Matching detected boxes to GT boxes from their IoU matrix, used by `count_TP()` in ./compute_f1_score.py
+Only the pairs whose IoU reaches the threshold can be matched, so both methods work on this sparse set of pairs.
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+MATCHING_METHODS = ["greedy", "hungarian"]
+
+
+def greedy_matching(iou_matrix, iou_threshold) -> list:
+    """
+    Same matches as the original argmax while-loop:
+        - Detections (rows) are matched in order.
+        - A detection tries its GT boxes (columns) from the highest IoU down, the lowest column first on ties.
+        - It takes the first GT box that is still free and whose IoU with every later detection is not higher.
+    
+    Whether a pair passes the last condition does not depend on the matches made before,
+    so it is checked for every above-threshold pair at once, and only the passing pairs are visited in order.
+    
+    Args:
+        iou_matrix (np.ndarray): (num_det, num_GT)
+        iou_threshold (float): IoU threshold
+    Returns:
+        list: [(det index, GT index), ...]
+    """
+    iou_matrix = np.asarray(iou_matrix)
+    rows, cols = np.nonzero((iou_matrix >= iou_threshold) & (iou_matrix > 0))
+    ious = iou_matrix[rows, cols]
+    if len(ious) == 0:
+        return list()
+    
+    # Highest IoU of the later detections in the same column: sort each column by descending row and take the running max
+    ranks = np.unique(ious, return_inverse=True)[1].astype(np.int64).reshape(-1)  # Exact integer keys
+    order = np.lexsort((-rows, cols))
+    keys = ranks[order] + cols[order] * (len(ious) + 1)  # Columns never overlap, so one running max covers them all
+    running_max = np.maximum.accumulate(keys)
+    is_first = np.r_[True, cols[order][1:] != cols[order][:-1]]
+    later_max = np.where(is_first, -1, np.r_[-1, running_max[:-1]] - cols[order] * (len(ious) + 1))
+    
+    passes = np.empty(len(ious), dtype=bool)
+    passes[order] = ranks[order] >= later_max
+    
+    # Visit the passing pairs by row, then descending IoU, then column
+    rows, cols, ious = rows[passes], cols[passes], ious[passes]
+    order = np.lexsort((cols, -ious, rows))
+    
+    matches = list()
+    matched_rows, matched_cols = set(), set()
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row in matched_rows or col in matched_cols:
+            continue
+        matches.append((row, col))
+        matched_rows.add(row)
+        matched_cols.add(col)
+    
+    return matches
+
+
+def hungarian_matching(iou_matrix, iou_threshold) -> list:
+    """
+    Optimal one-to-one matching: the largest number of above-threshold pairs, then the largest total IoU
+    
+    Args:
+        iou_matrix (np.ndarray): (num_det, num_GT)
+        iou_threshold (float): IoU threshold
+    Returns:
+        list: [(det index, GT index), ...]
+    """
+    iou_matrix = np.asarray(iou_matrix, dtype=np.float64)
+    is_valid = (iou_matrix >= iou_threshold) & (iou_matrix > 0)
+    
+    # Only the rows and columns with at least one valid pair take part
+    rows, cols = np.flatnonzero(is_valid.any(axis=1)), np.flatnonzero(is_valid.any(axis=0))
+    if len(rows) == 0:
+        return list()
+    
+    # Every match is worth more than any total IoU, so the number of matches comes first
+    weight = min(len(rows), len(cols)) + 1
+    score = np.where(is_valid[np.ix_(rows, cols)], weight + iou_matrix[np.ix_(rows, cols)], 0.)
+    row_idx, col_idx = linear_sum_assignment(score, maximize=True)
+    
+    return [
+        (int(rows[i]), int(cols[j])) for i, j in zip(row_idx, col_idx) if is_valid[rows[i], cols[j]]
+    ]
@@ -0,0 +1,80 @@
+"""
+Parallel F1 score evaluation of several splits
+
+The images of every (split, mode) job are cut into chunks, and the chunks of all jobs go to one process pool,
+so that several splits are evaluated at the same time. Each worker keeps one `Evaluator` per checkpoint.
+Results are merged back in `os.listdir()` order, so the histories are the same as `F1score.compute_f1_score()`.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+from .Evaluator import Evaluator, BATCH_SIZE
+
+CHUNK_SIZE = 32  # Images per task
+
+_evaluators = dict()  # Per worker process: {(checkpoint, matching, cache_dir): Evaluator}
+
+
+def evaluate_splits(jobs, num_workers=None, batch_size=BATCH_SIZE, matching="greedy", cache_dir=None, chunk_size=CHUNK_SIZE) -> dict:
+    """
+    Args:
+        jobs (list): [(split_name, mode, conf, iou_threshold), ...]
+        num_workers (int, optional): number of processes. Defaults to None (number of CPUs).
+        batch_size (int, optional): number of images per inference batch. Defaults to BATCH_SIZE.
+        matching (str, optional): "greedy" or "hungarian". Defaults to "greedy".
+        cache_dir (str, optional): prediction cache directory. Defaults to None (no cache).
+        chunk_size (int, optional): number of images per task. Defaults to CHUNK_SIZE.
+
+    Returns:
+        dict: {(split_name, mode): history}, with history = {filename: (f1, precision, recall)} as in `F1score`
+    """
+    num_workers = num_workers or os.cpu_count()
+
+    tasks = list()  # [(job index, filenames, task arguments), ...]
+    for i, (split_name, mode, conf, iou_threshold) in enumerate(jobs):
+        images_dir = f"data/splits/{split_name}/{mode}/images"
+        labels_dir = f"data/splits/{split_name}/{mode}/labels"
+        checkpoint = f"checkpoints/{split_name}/best.pt"
+        filenames = os.listdir(images_dir)
+
+        for start in range(0, len(filenames), chunk_size):
+            chunk = filenames[start:start + chunk_size]
+            img_paths = [f"{images_dir}/{filename}" for filename in chunk]
+            label_paths = [f"{labels_dir}/{filename[:-4]}.txt" for filename in chunk]
+            tasks.append(tuple([i, chunk, (checkpoint, img_paths, label_paths, conf, iou_threshold, batch_size, matching, cache_dir)]))
+
+    print(f"==>> Evaluating {len(jobs)} jobs in {len(tasks)} tasks with {num_workers} workers")
+
+    scores = [None] * len(tasks)
+    num_threads = max(1, os.cpu_count() // num_workers)  # Workers share the cores instead of each using all of them
+    context = multiprocessing.get_context("spawn")  # A forked worker cannot use CUDA
+
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_worker, initargs=(num_threads,)) as executor:
+        futures = {executor.submit(_evaluate_chunk, *args): k for k, (_, _, args) in enumerate(tasks)}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Evaluating"):
+            scores[futures[future]] = future.result()
+
+    # Merge in task order, which follows the job order and os.listdir() order
+    histories = {(split_name, mode): dict() for split_name, mode, _, _ in jobs}
+    for (i, chunk, _), chunk_scores in zip(tasks, scores):
+        split_name, mode, _, _ = jobs[i]
+        for filename, (f1, precision, recall) in zip(chunk, chunk_scores):
+            histories[(split_name, mode)][filename] = (f1, precision, recall)
+
+    return histories
+
+
+def _init_worker(num_threads) -> None:
+    import torch
+    torch.set_num_threads(num_threads)
+
+
+def _evaluate_chunk(checkpoint, img_paths, label_paths, conf, iou_threshold, batch_size, matching, cache_dir) -> list:
+    """Worker: [(f1, precision, recall), ...] of the given images, in order"""
+    key = tuple([checkpoint, matching, cache_dir])
+    if key not in _evaluators:
+        _evaluators[key] = Evaluator(checkpoint, matching, cache_dir)
+
+    return list(_evaluators[key].evaluate_batch(img_paths, label_paths, conf, iou_threshold, batch_size))
@@ -1,12 +1,15 @@
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from .ResultsStore import ResultsStore, RESULTS_STORE_PATH
 
 
-def save_f1_score(xlsx_file, save_path):
-    """Save f1 score as a plot"""
+def save_f1_score(xlsx_file, save_path, df=None):
+    """Save f1 score as a plot, from `df` (e.g. `ResultsStore.history()`) or else from the xlsx file"""
     # Read the xlsx file and get the columns
-    df = pd.read_excel(xlsx_file)
+    if df is None:
+        df = pd.read_excel(xlsx_file)
     df.columns = df.columns.str.strip()
     
     columns = ['f1', 'precision', 'recall']
@@ -60,4 +63,5 @@ if __name__ == "__main__":
     mode = 'val'  # Change this if needed
     xlsx_file = f'logs/{split_name}/{run_name}/{mode}/f1_score.xlsx' if run_name else f'logs/{split_name}/{mode}/f1_score.xlsx'
     save_path = f'logs/{split_name}/{run_name}/{mode}/f1_score.png' if run_name else f'logs/{split_name}/{mode}/f1_score.png'
-    save_f1_score(xlsx_file, save_path)
+    df = None if run_name or not os.path.exists(RESULTS_STORE_PATH) else ResultsStore().history(split_name, mode)  # Latest run in logs/results.sqlite, if any
+    save_f1_score(xlsx_file, save_path, df if df is not None and len(df) else None)
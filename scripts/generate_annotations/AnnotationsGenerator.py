@@ -7,30 +7,40 @@ from .riceprManager import riceprManager
 from .HorizontalBox import HorizontalBox
 from .OrientedBox import OrientedBox
 from .SkeletonBasedBox import SkeletonBasedBox
+from ..utils.image_size import image_size
 
 
 class AnnotationsGenerator:
-    def __init__(self, img_path, ricepr_path, bbox_size=None) -> None:
+    def __init__(self, img_path, ricepr_path, bbox_size=None, cache_dir=None) -> None:
         """
         Create an Annotations Generator for .ricepr files.
 
         Args:
             img_path (str): original image path
             ricepr_path (str): .ricepr file path
+            cache_dir (str, optional): parsed .ricepr cache directory, e.g. `RICEPR_CACHE_DIR`. Defaults to None (no cache).
         """
         assert ricepr_path.split("/")[-1].split(".")[-1].lower() == "ricepr", "The given path is not a .ricepr file"
         assert img_path.split("/")[-1].split(".")[0] == ricepr_path.split("/")[-1].split(".")[0], "Unmatched image and .ricepr file"
         
         self.img_path = img_path
-        self.img = cv2.imread(img_path)
+        self._img = None  # Decoded on first access, see `img`
+        self.width, self.height = image_size(img_path)
         self.ricepr_path = ricepr_path
-        self.ricepr_manager = riceprManager(PATH=ricepr_path)
+        self.ricepr_manager = riceprManager(PATH=ricepr_path, cache_dir=cache_dir)
         self.name = self.ricepr_manager.name
         self.species = self.ricepr_manager.species
         self.junctions, self.edges = self.ricepr_manager.read_ricepr()
         self.bbox_size = 26 if bbox_size is None else bbox_size
 
-    def generate_junctions(self, save_path_img=None, show=False, skeleton_based=False, oriented_method=0, save_path_txt=None) -> None:
+    @property
+    def img(self):
+        """The original image, only decoded when something is drawn or shown"""
+        if self._img is None:
+            self._img = cv2.imread(self.img_path)
+        return self._img
+
+    def generate_junctions(self, save_path_img=None, show=False, skeleton_based=False, oriented_method=0, save_path_txt=None, bbox_sizes=None) -> None:
         """
         Args:
             save_path_img: Specify if you want to save the generated image. Default to None.
@@ -41,15 +51,14 @@ class AnnotationsGenerator:
                 1: OBBv1
                 2: OBBv2
             save_path_txt: Specify if you want to ENCODE and save to .txt file. Default to None.
+            bbox_sizes (list): Several bbox sizes at once, instead of `self.bbox_size`. Default to None.
+                Outputs of each size go to a `<save_path>/<bbox_size>/` sub-directory.
         """
         assert oriented_method in [0, 1, 2], "Invalid oriented_method"
         
         junctions = self.junctions.return_junctions()
         boxes = list()
         
-        img_copy = self.img.copy()
-        bbox_size = self.bbox_size
-        
         if skeleton_based:
             self.junctions.remove_end_generating()
             generating = self.junctions.return_generating()
@@ -64,36 +73,47 @@ class AnnotationsGenerator:
             
             junctions = skeleton_based_box.run(main_axis_junctions)
 
+        # Junction positions and OBB angles do not depend on the bbox size, so they are computed once
         if oriented_method:
             oriented_box = OrientedBox(junctions)
-            rects = oriented_box.run(width=bbox_size, height=bbox_size, method=oriented_method)  # rects = [(center, (width, height), angle)]
-            boxes = rects
-            
-            for rect in rects:
-                obb = cv2.boxPoints(rect)  # 4 corner coords
-                obb = np.intp(obb)
-                cv2.drawContours(img_copy, [obb], 0, (0, 255, 255), 2)
+            oriented_box.find_neighbor()
+            oriented_box.find_theta(oriented_method)
+
+        for bbox_size in ([self.bbox_size] if bbox_sizes is None else bbox_sizes):
+            img_copy = self.img.copy() if show or save_path_img else None
             
-        else:
-            horizontal_box = HorizontalBox(junctions)
-            rects = horizontal_box.run_junctions(width=bbox_size, height=bbox_size)  # rects = [(pt1, pt2)]
-            boxes = junctions
-            for pt1, pt2 in rects:
-                cv2.rectangle(img_copy, pt1, pt2, (0, 255, 255), 2)
+            if oriented_method:
+                rects = oriented_box.find_rect(width=bbox_size, height=bbox_size)  # rects = [(x, y, width, height, angle)]
+                boxes = rects
                 
-        if show:
-            self._show(img_copy)
-            
-        if save_path_img:
-            save_path_img = save_path_img + "/" + self.name + "_junctions.jpg"
-            print(f"==>> Saving {save_path_img}")
-            cv2.imwrite(save_path_img, img_copy)
+                if img_copy is not None:
+                    for x, y, w, h, angle in rects:
+                        obb = cv2.boxPoints(((x, y), (w, h), angle))  # 4 corner coords
+                        obb = np.intp(obb)
+                        cv2.drawContours(img_copy, [obb], 0, (0, 255, 255), 2)
+                
+            else:
+                horizontal_box = HorizontalBox(junctions)
+                rects = horizontal_box.run_junctions(width=bbox_size, height=bbox_size)  # rects = [(pt1, pt2)]
+                boxes = junctions
+                if img_copy is not None:
+                    for pt1, pt2 in rects:
+                        cv2.rectangle(img_copy, pt1, pt2, (0, 255, 255), 2)
+                    
+            if show:
+                self._show(img_copy)
+                
+            if save_path_img:
+                save_dir = save_path_img if bbox_sizes is None else self._size_dir(save_path_img, bbox_size)
+                save_path = save_dir + "/" + self.name + "_junctions.jpg"
+                print(f"==>> Saving {save_path}")
+                cv2.imwrite(save_path, img_copy)
             
         if save_path_txt:
             print("==>> Encoding junctions")
-            self.encode_junctions(boxes, save_path_txt, oriented_method)
+            self.encode_junctions(boxes, save_path_txt, oriented_method, bbox_sizes=bbox_sizes)
             
-    def encode_junctions(self, boxes, save_path, method) -> None:
+    def encode_junctions(self, boxes, save_path, method, bbox_sizes=None) -> None:
         """
         Args:
             boxes (list)
@@ -101,6 +121,8 @@ class AnnotationsGenerator:
                 OBB: [(x, y, w, h, r), ...]
             method (int): 0: "HBB" or 1: "OBBv1" or 2: "OBBv2"
             save_path (str): file path
+            bbox_sizes (list): Encode several bbox sizes at once, one `<save_path>/<bbox_size>/` sub-directory per size.
+                For OBB, (w, h) of `boxes` are replaced by each size. Default to None (`self.bbox_size` for HBB, `boxes` as is for OBB).
         
         Results:
             Horizontal box: (class_index x y w h), normalized between 0 and 1
@@ -119,15 +141,17 @@ class AnnotationsGenerator:
             
             Refer to this image: https://github.com/ultralytics/docs/releases/download/0/obb-format-examples.avif
         """
-        save_path = save_path + "/" + self.name + "_junctions.txt"
-        print(f"==>> Saving {save_path}")
+        if bbox_sizes is None:
+            save_paths = [save_path + "/" + self.name + "_junctions.txt"]
+        else:
+            save_paths = [self._size_dir(save_path, bbox_size) + "/" + self.name + "_junctions.txt" for bbox_size in bbox_sizes]
 
         # Encoding functions
         def xywhr2xyxyxyxy(boxes: list) -> list:
             xyxyxyxy = list()
 
-            for xywhr in boxes:
-                obb = cv2.boxPoints(xywhr)  # 4 corner coords
+            for x, y, w, h, r in boxes:
+                obb = cv2.boxPoints(((x, y), (w, h), r))  # 4 corner coords
 
                 # Extract the four corner coordinates of the box
                 x1, y1 = obb[np.argmin(obb[:, 1])].tolist()  # topmost in inverted y-axis: lowest y
@@ -161,30 +185,39 @@ class AnnotationsGenerator:
             return formatted_coords
             
         # Encoding
-        height, width, _ = self.img.shape
+        height, width = self.height, self.width
         
         if method == 0:
-            with open(save_path, "w") as f:
-                for x, y in boxes:
-                    x, y = int(x) / width, int(y) / height
-                    bbox_size = self.bbox_size
-                    w, h = bbox_size / width, bbox_size / height
-                    class_index = 0
-                    f.write(f"{class_index} {x:.6g} {y:.6g} {w:.6g} {h:.6g}\n")
+            # Centers are shared by every size
+            centers = [f"{int(x) / width:.6g} {int(y) / height:.6g}" for x, y in boxes]
+            
+            for bbox_size, save_path in zip([self.bbox_size] if bbox_sizes is None else bbox_sizes, save_paths):
+                print(f"==>> Saving {save_path}")
+                w, h = bbox_size / width, bbox_size / height
+                class_index = 0
+                with open(save_path, "w") as f:
+                    for center in centers:
+                        f.write(f"{class_index} {center} {w:.6g} {h:.6g}\n")
                     
-        elif method == 1:
-            with open(save_path, "w") as f:
-                for x1, y1, x2, y2, x3, y3, x4, y4 in xywhr2xyxyxyxy(boxes):
-                    x1, y1, x2, y2, x3, y3, x4, y4 = normalize([x1, y1, x2, y2, x3, y3, x4, y4], width, height)
-                    class_index = 0
-                    f.write(f"{class_index} {x1} {y1} {x2} {y2} {x3} {y3} {x4} {y4}\n")
+        elif method in [1, 2]:
+            boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 5)
             
-        elif method == 2:
-            with open(save_path, "w") as f:
-                for x1, y1, x2, y2, x3, y3, x4, y4 in xywhr2xyxyxyxy(boxes):
-                    x1, y1, x2, y2, x3, y3, x4, y4 = normalize([x1, y1, x2, y2, x3, y3, x4, y4], width, height)
-                    class_index = 0
-                    f.write(f"{class_index} {x1} {y1} {x2} {y2} {x3} {y3} {x4} {y4}\n")
+            for bbox_size, save_path in zip([None] if bbox_sizes is None else bbox_sizes, save_paths):
+                print(f"==>> Saving {save_path}")
+                if bbox_size is not None:
+                    boxes[:, 2:4] = bbox_size
+                    
+                with open(save_path, "w") as f:
+                    for x1, y1, x2, y2, x3, y3, x4, y4 in xywhr2xyxyxyxy(boxes):
+                        x1, y1, x2, y2, x3, y3, x4, y4 = normalize([x1, y1, x2, y2, x3, y3, x4, y4], width, height)
+                        class_index = 0
+                        f.write(f"{class_index} {x1} {y1} {x2} {y2} {x3} {y3} {x4} {y4}\n")
+
+    def _size_dir(self, save_path, bbox_size) -> str:
+        """<save_path>/<bbox_size>/, used when generating several bbox sizes at once"""
+        save_dir = f"{save_path}/{bbox_size}"
+        os.makedirs(save_dir, exist_ok=True)
+        return save_dir
 
     # TODO: Implement this function
     def generate_branches(self, level, save_path_img=None, show=False, save_path_txt=None) -> None:
@@ -283,45 +316,52 @@ class AnnotationsGenerator:
 
     def generate_junction_distance(self, save_path=None, return_distance=False) -> None:
         """draw the junction distance from .ricepr file to the image, mainly for visualizing purposes"""
-        img = self.img.copy()
-        terminals = self.junctions.return_terminal()
-        primary = self.junctions.return_primary()
-        secondary = self.junctions.return_secondary()
-        tertiary = self.junctions.return_tertiary()
-        generating = self.junctions.return_generating()
         edges = self.edges
         
         junction_distance = list()
+        is_terminal = self.junctions.isin(edges.array[:, 2:], "terminal")
         
-        for edge in edges:
+        for edge, ends_at_terminal in zip(edges, is_terminal):
             x1, y1, x2, y2 = edge
-            if (x2, y2) in terminals:
+            if ends_at_terminal:
                 continue
-            cv2.line(img, (x1, y1), (x2, y2), (0, 255, 255), 2)
             dist = math.dist((x1, y1), (x2, y2))
             junction_distance.append(dist)
 
-        for terminal in terminals:
-            x, y = terminal
-            cv2.circle(img, (x, y), 5, (0, 0, 255), -1)
+        if save_path:
+            img = self.img.copy()
+            terminals = self.junctions.return_terminal()
+            primary = self.junctions.return_primary()
+            secondary = self.junctions.return_secondary()
+            tertiary = self.junctions.return_tertiary()
+            generating = self.junctions.return_generating()
+            
+            for edge, ends_at_terminal in zip(edges, is_terminal):
+                x1, y1, x2, y2 = edge
+                if ends_at_terminal:
+                    continue
+                cv2.line(img, (x1, y1), (x2, y2), (0, 255, 255), 2)
 
-        for junction in primary:
-            x, y = junction
-            cv2.circle(img, (x, y), 5, (255, 255, 255), -1)
+            for terminal in terminals:
+                x, y = terminal
+                cv2.circle(img, (x, y), 5, (0, 0, 255), -1)
 
-        for junction in secondary:
-            x, y = junction
-            cv2.circle(img, (x, y), 5, (255, 0, 0), -1)
+            for junction in primary:
+                x, y = junction
+                cv2.circle(img, (x, y), 5, (255, 255, 255), -1)
 
-        for junction in tertiary:
-            x, y = junction
-            cv2.circle(img, (x, y), 5, (0, 255, 0), -1)
+            for junction in secondary:
+                x, y = junction
+                cv2.circle(img, (x, y), 5, (255, 0, 0), -1)
 
-        for junction in generating:
-            x, y = junction
-            cv2.circle(img, (x, y), 5, (255, 255, 0), -1)
+            for junction in tertiary:
+                x, y = junction
+                cv2.circle(img, (x, y), 5, (0, 255, 0), -1)
+
+            for junction in generating:
+                x, y = junction
+                cv2.circle(img, (x, y), 5, (255, 255, 0), -1)
         
-        if save_path:
             cv2.imwrite(f"{save_path}/{self.name}_junction_distance.jpg", img)
             
         if return_distance:
@@ -342,7 +382,7 @@ class AnnotationsGenerator:
         for edge in self.edges:
             x1, y1, x2, y2 = edge
             
-            if (x2, y2) in self.junctions.return_terminal():
+            if self.junctions.contains((x2, y2), "terminal"):
                 
                 # ============================================== #
                 #     Conditions to avoid small bounding boxes   #
@@ -390,7 +430,7 @@ class AnnotationsGenerator:
         for edge in self.edges:
             x1, y1, x2, y2 = edge
             
-            if (x2, y2) in self.junctions.return_terminal():
+            if self.junctions.contains((x2, y2), "terminal"):
                 
                 # ============================================== #
                 #     Conditions to avoid small bounding boxes   #
@@ -463,4 +503,21 @@ class AnnotationsGenerator:
         xywh = (x_center, y_center, width, height)
         
         return xywh
+    
+    def _encode_box(self, boxes, save_path, mode) -> None:
+        """
+        Write (x, y, w, h) boxes in pixels as a YOLO HBB label file, normalized like `encode_junctions()`
+
+        Args:
+            boxes (list): [(x, y, w, h), ...]
+            save_path (str): .txt file path
+            mode (str): annotation type, only "grains" for now (class index 0)
+        """
+        assert mode in ["grains"], "Invalid mode"
+        height, width = self.height, self.width
+        class_index = 0
+        
+        with open(save_path, "w") as f:
+            for x, y, w, h in boxes:
+                f.write(f"{class_index} {x / width:.6g} {y / height:.6g} {w / width:.6g} {h / height:.6g}\n")
     
\ No newline at end of file
@@ -1,26 +1,42 @@
+import numpy as np
+
+
 class Edges:
-    """an edge manager for an image"""
-    num_entry = 0
+    """an edge manager for an image, backed by an (E, 4) int32 array of (x1, y1, x2, y2)"""
     
     def __init__(self):
-        self.entries = []
+        self.array = np.empty((0, 4), dtype=np.int32)
+        self._entries = None  # [(x1, y1, x2, y2), ...], built on demand
     
     def __len__(self):
-        return self.num_entry
+        return len(self.array)
     
     def __getitem__(self, index):
         return self.entries[index]
     
+    def __iter__(self):
+        return iter(self.entries)
+    
+    @property
+    def num_entry(self) -> int:
+        return len(self.array)
+    
+    @property
+    def entries(self) -> list:
+        if self._entries is None:
+            self._entries = [tuple(edge) for edge in self.array.tolist()]
+        return self._entries
+    
     def add(self, edges) -> None:
         """
         Args:
-            edges (list): [(x1, y1, x2, y2), ...]
+            edges (list, np.ndarray): [(x1, y1, x2, y2), ...]
         """
-        for edge in edges:
-            assert len(edge) == 4, "Incorrect edge format"
-            edge = tuple(edge)
-            self.entries.append(edge)
-            self.num_entry += 1
+        edges = np.asarray(edges, dtype=np.int32)
+        edges = edges.reshape(-1, 4) if edges.size == 0 else edges
+        assert edges.ndim == 2 and edges.shape[1] == 4, "Incorrect edge format"
+        self.array = np.concatenate([self.array, edges])
+        self._entries = None
             
         
 def test():
@@ -29,9 +45,10 @@ def test():
     assert edges.num_entry == 2
     assert len(edges) == 2
     assert len(edges[0]) == 4
+    assert edges[1] == (5, 6, 7, 8)
+    assert list(edges) == [(1, 2, 3, 4), (5, 6, 7, 8)]
     print("All tests passed")
     
 
 if __name__ == "__main__":
     test()
-    
\ No newline at end of file
@@ -1,43 +1,65 @@
+import numpy as np
+
+LEVELS = ["generating", "terminal", "primary", "secondary", "tertiary", "quaternary"]
+
+
 class Junctions:
-    """a junction manager for an image"""
-    num_entry = 0
-    
+    """
+    a junction manager for an image
+
+    Junctions are stored as an (N, 2) int32 array of coordinates and an (N,) uint8 array of level codes (index in `LEVELS`).
+    The `return_*` accessors still return lists of (x, y) tuples, built once and reused until the content changes.
+    """
+
     def __init__(self):
-        self.level = ["generating", "terminal", "primary", "secondary", "tertiary", "quaternary"]
-        self.entries = {level : [] for level in self.level}
-        
+        self.level = list(LEVELS)
+        self.coords = np.empty((0, 2), dtype=np.int32)
+        self.levels = np.empty((0,), dtype=np.uint8)
+        self._pending = list()  # [(x, y, code), ...] added but not yet stacked into the arrays
+        self._index = dict()  # {(x, y): row}
+        self._cache = dict()  # {level: [(x, y), ...]}
+
     def __len__(self):
         return self.num_entry
-    
+
+    @property
+    def num_entry(self) -> int:
+        return len(self.levels) + len(self._pending)
+
+    @property
+    def entries(self) -> dict:
+        return {level: self._return_level(level) for level in self.level}
+
     def return_entries(self) -> dict:
         return self.entries
-    
+
     def return_generating(self) -> list:
-        return self.entries["generating"]
-    
+        return self._return_level("generating")
+
     def return_terminal(self) -> list:
-        return self.entries["terminal"]
-    
+        return self._return_level("terminal")
+
     def return_primary(self) -> list:
-        return self.entries["primary"]
-        
+        return self._return_level("primary")
+
     def return_secondary(self) -> list:
-        return self.entries["secondary"]
-        
+        return self._return_level("secondary")
+
     def return_tertiary(self) -> list:
-        return self.entries["tertiary"]
-        
+        return self._return_level("tertiary")
+
     def return_quaternary(self) -> list:
-        return self.entries["quaternary"]
-    
+        return self._return_level("quaternary")
+
     def return_junctions(self) -> list:
-        generating = self.return_generating()
-        primary = self.return_primary()
-        secondary = self.return_secondary()
-        tertiary = self.return_tertiary()
-        quaternary = self.return_quaternary()
-        return generating + primary + secondary + tertiary + quaternary
-    
+        """Every junction but terminals, ordered as generating + primary + secondary + tertiary + quaternary"""
+        if "junctions" not in self._cache:
+            self._flush()
+            order = np.argsort(self.levels, kind="stable")
+            order = order[self.levels[order] != LEVELS.index("terminal")]
+            self._cache["junctions"] = [tuple(coord) for coord in self.coords[order].tolist()]
+        return self._cache["junctions"]
+
     def add(self, level, coord) -> None:
         """
         Args:
@@ -46,30 +68,107 @@ class Junctions:
         """
         assert len(coord) == 2, "Invalid coord"
         assert level.lower() in self.level, "Invalid level"
-        
-        coord = tuple(coord)
-        level = level.lower()
-        
-        self.num_entry += 1
-        self.entries[level].append(coord)
-        
+
+        x, y = coord
+        self._pending.append((x, y, self.level.index(level.lower())))
+        self._cache.clear()
+
+    def extend(self, coords, levels) -> None:
+        """
+        Add many junctions at once
+
+        Args:
+            coords (np.ndarray): (N, 2) coordinates
+            levels (np.ndarray): (N,) level codes, i.e. index in `LEVELS`
+        """
+        coords = np.asarray(coords, dtype=np.int32).reshape(-1, 2)
+        levels = np.asarray(levels, dtype=np.uint8).reshape(-1)
+        assert len(coords) == len(levels), "Unmatched coords and levels"
+        assert np.all(levels < len(self.level)), "Invalid level"
+
+        self._flush()
+        start = len(self.levels)
+        self.coords = np.concatenate([self.coords, coords])
+        self.levels = np.concatenate([self.levels, levels])
+        self._reindex(start)
+        self._cache.clear()
+
+    def index_of(self, coord):
+        """Returns the row of the (first) junction at `coord`, or None"""
+        self._flush()
+        return self._index.get(tuple(coord))
+
+    def contains(self, coord, level) -> bool:
+        """Same as `coord in self.return_<level>()`, through the hashed index"""
+        row = self.index_of(coord)
+        if row is None:
+            return False
+        if self.levels[row] == self.level.index(level.lower()):
+            return True
+        return bool(self.isin([coord], level)[0])  # The same point may sit on several levels
+
+    def isin(self, points, level) -> np.ndarray:
+        """
+        Args:
+            points (array-like): (M, 2) coordinates
+            level (str): one of `LEVELS`
+
+        Returns:
+            np.ndarray: (M,) bool, True where the point is a junction of this level
+        """
+        self._flush()
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        coords = self.coords[self.levels == self.level.index(level.lower())]
+        return np.isin(self._keys(points), self._keys(coords))
+
     def remove_end_generating(self) -> None:
         """
         Remove the end generating junction when it is not the junction
         """
-        generating = self.entries["generating"]
+        generating = self.return_generating()
         assert len(generating) == 2, "Incorrect number of generating junctions"
-        
+
         # ============================================================ #
         #   End gen. junction has smaller x than Start gen. junction   #
         # ============================================================ #
         generating = sorted(generating, key=lambda x: x[0])
         end_generating = generating[0]
-        self.entries["generating"].remove(end_generating)
-        assert len(self.entries["generating"]) == 1, "Incorrect number of generating junctions"
-        self.num_entry -= 1
-        
-        
+
+        is_end_generating = (self.levels == LEVELS.index("generating")) & np.all(self.coords == end_generating, axis=1)
+        row = int(np.argmax(is_end_generating))
+        self.coords = np.delete(self.coords, row, axis=0)
+        self.levels = np.delete(self.levels, row)
+        self._index = dict()
+        self._reindex(start=0)
+        self._cache.clear()
+        assert len(self.return_generating()) == 1, "Incorrect number of generating junctions"
+
+    def _return_level(self, level) -> list:
+        if level not in self._cache:
+            self._flush()
+            coords = self.coords[self.levels == self.level.index(level)]
+            self._cache[level] = [tuple(coord) for coord in coords.tolist()]
+        return self._cache[level]
+
+    def _reindex(self, start) -> None:
+        """Index the rows from `start` onwards"""
+        for row, coord in enumerate(map(tuple, self.coords[start:].tolist()), start=start):
+            self._index.setdefault(coord, row)
+
+    def _flush(self) -> None:
+        """Stack the junctions added one by one into the arrays"""
+        if self._pending:
+            pending = np.array(self._pending, dtype=np.int32)
+            self._pending = list()
+            self.extend(pending[:, :2], pending[:, 2])
+
+    @staticmethod
+    def _keys(points) -> np.ndarray:
+        """(M, 2) coordinates -> (M,) int64 keys, so that points can be compared with np.isin"""
+        points = np.asarray(points, dtype=np.int64)
+        return (points[:, 0] << 32) | (points[:, 1] & 0xFFFFFFFF)
+
+
 def test():
     junctions = Junctions()
     junctions.add(coord=(123, 345), level="Primary")
@@ -79,13 +178,17 @@ def test():
     junctions.add(coord=(500, 500), level="generating")
     assert junctions.num_entry == 3
     assert len(junctions.return_generating()) == 2
+    assert junctions.return_junctions() == [(110, 500), (500, 500), (123, 345)]
+    assert junctions.contains((123, 345), "primary") and not junctions.contains((123, 345), "generating")
+    assert junctions.index_of((500, 500)) == 2
     junctions.remove_end_generating()
     assert junctions.num_entry == 2
     assert len(junctions.return_generating()) == 1
     assert len(junctions.entries["generating"]) == 1
+    assert junctions.return_generating() == [(500, 500)]
     print("All tests passed")
 
 
 if __name__ == "__main__":
     test()
-    
\ No newline at end of file
+
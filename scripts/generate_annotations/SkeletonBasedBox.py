@@ -15,14 +15,15 @@ import numpy as np
 import cv2
 from skimage.morphology import skeletonize
 from sklearn.cluster import DBSCAN
+from ..utils.image_size import image_size
 
 SEGMENTATION_MASK_SIZE = (512, 512)
 
 
 class SkeletonBasedBox:
     def __init__(self, img_path, binary_img_path) -> None:
-        self.img = cv2.imread(img_path)
-        self.orig_size = self.img.shape[:2][::-1]  # (width, height)
+        self.img_path = img_path
+        self.orig_size = image_size(img_path)  # (width, height), from the header: the pixels are never used
         self.binary_img = cv2.imread(binary_img_path, cv2.IMREAD_GRAYSCALE)
         
     def run(self, main_axis_junctions) -> list:
@@ -42,7 +43,8 @@ class SkeletonBasedBox:
         skeleton_main_axis_img = self.get_main_axis_skeleton(skeleton_img, main_axis_junctions_resized)
         main_axis_intersection_pts = self.crossing_number(skeleton_main_axis_img)  # (y, x)
         
-        high_order_intersection_pts = [pts for pts in intersection_pts if pts not in main_axis_intersection_pts]
+        main_axis_intersection_set = set(main_axis_intersection_pts)
+        high_order_intersection_pts = [pts for pts in intersection_pts if pts not in main_axis_intersection_set]
         high_order_intersection_pts_merged = self.merge_high_order_junctions(high_order_intersection_pts)
         
         junctions = main_axis_intersection_pts + high_order_intersection_pts_merged  # (y, x)
@@ -65,29 +67,29 @@ class SkeletonBasedBox:
     
         # White px intensity 255 -> 1
         img[img == 255] = 1
-        white_px = np.argwhere(img > 0)
-        intersection_pts = list()
-
-        # Crossing number
-        for row, col in white_px:
-            row, col = int(row), int(col)
-
-            try:
-                P1 = img[row, col + 1].astype("i")
-                P2 = img[row - 1, col + 1].astype("i")
-                P3 = img[row - 1, col].astype("i")
-                P4 = img[row - 1, col - 1].astype("i")
-                P5 = img[row, col - 1].astype("i")
-                P6 = img[row + 1, col - 1].astype("i")
-                P7 = img[row + 1, col].astype("i")
-                P8 = img[row + 1, col + 1].astype("i")
-            except:
-                continue
-
-            crossing_number = abs(P2 - P1) + abs(P3 - P2) + abs(P4 - P3) + abs(P5 - P4) + abs(P6 - P5) + abs(P7 - P6) + abs(P8 - P7) + abs(P1 - P8)
-            crossing_number //= 2
-            if crossing_number == 3 or crossing_number == 4:
-                intersection_pts.append((row, col))
+        img = img.astype("i")
+        height, width = img.shape
+
+        # Pad once. Row/column -1 wraps around to the last row/column, as negative indexing does.
+        padded = np.pad(img, 1, mode="wrap")
+
+        def neighbor(d_row, d_col):
+            return padded[1 + d_row:1 + d_row + height, 1 + d_col:1 + d_col + width]
+
+        # P1, ..., P8, counterclockwise from the right neighbor
+        P = [neighbor(0, 1), neighbor(-1, 1), neighbor(-1, 0), neighbor(-1, -1), neighbor(0, -1), neighbor(1, -1), neighbor(1, 0), neighbor(1, 1)]
+
+        # Crossing number, for every pixel at once
+        crossing_number = sum(np.abs(P[(i + 1) % 8] - P[i]) for i in range(8))
+        crossing_number //= 2
+        is_intersection = (img > 0) & ((crossing_number == 3) | (crossing_number == 4))
+
+        # Pixels in the last row or column have no (row + 1) or (col + 1) neighbor and are skipped
+        is_intersection[-1, :] = False
+        is_intersection[:, -1] = False
+
+        # Row-major order, same as iterating over the white pixels
+        intersection_pts = [tuple(point) for point in np.argwhere(is_intersection).tolist()]
 
         return intersection_pts
     
@@ -116,21 +118,25 @@ class SkeletonBasedBox:
         return skeleton_main_axis_img
     
     def merge_high_order_junctions(self, high_order_intersection_pts) -> list:
-        high_order_intersection_pts_merged = high_order_intersection_pts.copy()
+        # Nothing to merge, and DBSCAN does not accept an empty array
+        if len(high_order_intersection_pts) == 0:
+            return list()
         
         high_order_intersection_pts_np = np.array(high_order_intersection_pts)
         db = DBSCAN(eps=7, min_samples=2).fit(high_order_intersection_pts_np)
         labels = db.labels_
         
-        # Merging
-        for label in np.unique(labels):
-            if label != -1:
-                pts = high_order_intersection_pts_np[labels == label]
-                for point in pts:
-                    high_order_intersection_pts_merged.remove(tuple(point))
-
-                x, y = np.mean(pts, axis=0).astype("i")
-                high_order_intersection_pts_merged.append((x, y))
+        # Noise points are kept as they are, in their original order
+        is_noise = labels == -1
+        high_order_intersection_pts_merged = [tuple(point) for point in high_order_intersection_pts_np[is_noise].tolist()]
+        
+        # Merging: every cluster is replaced by its mean point, in label order
+        cluster_labels = labels[~is_noise]
+        if len(cluster_labels) > 0:
+            cluster_pts = high_order_intersection_pts_np[~is_noise]
+            counts = np.bincount(cluster_labels)
+            sums = np.column_stack([np.bincount(cluster_labels, weights=cluster_pts[:, i]) for i in range(2)])
+            means = (sums / counts[:, None]).astype("i")
+            high_order_intersection_pts_merged += [(x, y) for x, y in means.tolist()]
                 
         return high_order_intersection_pts_merged
-    
\ No newline at end of file
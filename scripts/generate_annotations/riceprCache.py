@@ -0,0 +1,91 @@
+"""
+Parsing a .ricepr file is the slowest part of reading a rice panicle, and the same files are read again
+for every bbox size, every HBB/OBBv1/OBBv2 variant and every split.
+This cache keeps the parsed content of each .ricepr file as a compact .npz file:
+    - coords (N, 2) int32: vertex coordinates, in file order
+    - levels (N,) uint8: junction level code, i.e. the index in `Junctions.LEVELS`
+    - edges (E, 4) int32: (x1, y1, x2, y2)
+
+An entry is keyed on the absolute .ricepr path. It is valid while the file keeps its mtime and size,
+or, if those changed, while the file still has the same SHA-1 hash.
+"""
+
+import os
+import hashlib
+import numpy as np
+
+RICEPR_CACHE_DIR = "cache/ricepr"
+
+
+class riceprCache:
+    """on-disk cache of parsed .ricepr files"""
+
+    def __init__(self, cache_dir=RICEPR_CACHE_DIR) -> None:
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load(self, ricepr_path):
+        """
+        Returns:
+            tuple: (coords, levels, edges) as returned by `riceprManager._parse_ricepr()`, or None if there is no valid entry
+        """
+        entry_path = self._entry_path(ricepr_path)
+        if not os.path.exists(entry_path):
+            return None
+
+        try:
+            with np.load(entry_path) as entry:
+                entry = {key: entry[key] for key in entry.files}
+        except (OSError, ValueError):  # Corrupted entry
+            return None
+
+        mtime_ns, size = self._stat(ricepr_path)
+        if (int(entry["mtime_ns"]), int(entry["size"])) != (mtime_ns, size):
+            # The file was touched or rewritten, the content decides
+            if str(entry["sha1"]) != self._hash(ricepr_path):
+                return None
+            entry["mtime_ns"], entry["size"] = np.int64(mtime_ns), np.int64(size)
+            self._write(entry_path, entry)
+
+        return entry["coords"], entry["levels"], entry["edges"]
+
+    def save(self, ricepr_path, coords, levels, edges) -> None:
+        """
+        Args:
+            ricepr_path (str): .ricepr file path
+            coords (np.ndarray): (N, 2) vertex coordinates
+            levels (np.ndarray): (N,) level codes
+            edges (np.ndarray): (E, 4) edges
+        """
+        mtime_ns, size = self._stat(ricepr_path)
+        entry = {
+            "coords": np.asarray(coords, dtype=np.int32).reshape(-1, 2),
+            "levels": np.asarray(levels, dtype=np.uint8),
+            "edges": np.asarray(edges, dtype=np.int32).reshape(-1, 4),
+            "mtime_ns": np.int64(mtime_ns),
+            "size": np.int64(size),
+            "sha1": np.array(self._hash(ricepr_path)),
+        }
+        self._write(self._entry_path(ricepr_path), entry)
+
+    def _entry_path(self, ricepr_path) -> str:
+        key = hashlib.sha1(os.path.abspath(ricepr_path).encode()).hexdigest()
+        name = os.path.basename(ricepr_path).rsplit(".", 1)[0]
+        return f"{self.cache_dir}/{name}_{key[:16]}.npz"
+
+    def _write(self, entry_path, entry) -> None:
+        """Write to a temporary file first so that concurrent readers never see a partial entry"""
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **entry)
+        os.replace(tmp_path, entry_path)
+
+    @staticmethod
+    def _stat(path) -> tuple:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _hash(path) -> str:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
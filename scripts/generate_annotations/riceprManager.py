@@ -1,23 +1,40 @@
 import math
+import re
 import xml.etree.ElementTree as ET
-from .Junctions import Junctions
+import numpy as np
+from .Junctions import Junctions, LEVELS
 from .Edges import Edges
+from .riceprCache import riceprCache
+
+# .ricepr vertex type -> junction level ("Seconday" is the spelling used in .ricepr files)
+VERTEX_TYPES = {
+    "Generating": "generating",
+    "End": "terminal",
+    "Primary": "primary",
+    "Seconday": "secondary",
+    "Tertiary": "tertiary",
+}
+POINT_FORMAT = "java.awt.Point[x={},y={}]"
+POINT_PATTERN = re.compile(r"x=\s*(-?\d+),\s*y=\s*(-?\d+)")
 
 
 class riceprManager:
-    def __init__(self, PATH):
+    def __init__(self, PATH, cache_dir=None):
         """
         Create a manager for .ricepr files.
 
         Args:
             PATH (str): .ricepr file path
+            cache_dir (str, optional): Directory of the parsed .ricepr cache (see riceprCache.py). Defaults to None (no cache).
         """
         self.PATH = PATH
+        self.cache_dir = cache_dir
         self.name = self.PATH.split("/")[-1].split(".")[0]
         self.species = "Asian" if "Asian" in PATH else "African" if "African" in PATH else None
         self.format = ".ricepr"
         self.junctions = Junctions()
         self.edges = Edges()
+        self.vertex_index = dict()
     
     def read_ricepr(self) -> tuple:
         """
@@ -26,73 +43,95 @@ class riceprManager:
         Returns:
             tuple: (Junctions, Edges)
         """
-        print(f"==>> riceprManager - Reading {self.name + self.format}")
-        junctions = self._get_junctions()
-        for level in junctions:
-            for coord in junctions[level]:
-                self.junctions.add(level=level, coord=coord)
-            
-        edges = self._get_edges()
+        cache = riceprCache(self.cache_dir) if self.cache_dir else None
+        content = cache.load(self.PATH) if cache else None
+        
+        if content is None:
+            print(f"==>> riceprManager - Reading {self.name + self.format}")
+            coords, levels, edges = self._parse_ricepr()
+            if cache:
+                cache.save(self.PATH, coords, levels, edges)
+        else:
+            print(f"==>> riceprManager - Loading cached {self.name + self.format}")
+            coords, levels, edges = content
+        
+        self.vertex_index = self._index_vertices(coords, levels)
+        order = np.argsort(levels, kind="stable")  # Junctions grouped by level, in file order within a level
+        self.junctions.extend(coords[order], levels[order])
         self.edges.add(edges=edges)
         
         return (self.junctions, self.edges)
         
+    def _parse_ricepr(self) -> tuple:
+        """
+        Parse the given .ricepr file in a single streaming pass
+        
+        Returns:
+            tuple: (coords, levels, edges)
+                coords (np.ndarray): (N, 2) int32 vertex coordinates, in file order
+                levels (np.ndarray): (N,) uint8 level codes, i.e. index in `LEVELS`
+                edges (np.ndarray): (E, 4) int32 (x1, y1, x2, y2)
+        """
+        coords = list()
+        levels = list()
+        points = dict()  # {"java.awt.Point[x=..,y=..]": (x, y)}
+        raw_edges = list()
+        
+        for _, elem in ET.iterparse(self.PATH, events=("end",)):
+            if elem.tag == "vertex":
+                coord = (int(elem.attrib['x']), int(elem.attrib['y']))
+                level = VERTEX_TYPES.get(elem.attrib['type'])
+                if level is not None:
+                    coords.append(coord)
+                    levels.append(LEVELS.index(level))
+                points[POINT_FORMAT.format(*coord)] = coord
+                elem.clear()
+            elif elem.tag == "edge":
+                raw_edges.append((elem.attrib['vertex1'], elem.attrib['vertex2']))
+                elem.clear()
+        
+        # Edges are resolved once every vertex has been seen
+        edges = [self._resolve_point(vertex1, points) + self._resolve_point(vertex2, points) for vertex1, vertex2 in raw_edges]
+        
+        coords = np.array(coords, dtype=np.int32).reshape(-1, 2)
+        levels = np.array(levels, dtype=np.uint8)
+        edges = np.array(edges, dtype=np.int32).reshape(-1, 4)
+        
+        return coords, levels, edges
+    
+    def _index_vertices(self, coords, levels) -> dict:
+        """Returns {(x, y): level}"""
+        vertex_index = dict()
+        for coord, code in zip(map(tuple, coords.tolist()), levels.tolist()):
+            vertex_index.setdefault(coord, LEVELS[code])
+        return vertex_index
+    
+    def _resolve_point(self, point, points) -> tuple:
+        """
+        Turn a `java.awt.Point[x=..,y=..]` string into (x, y).
+        Endpoints whose vertex has been removed (see interactive_labelling) are not indexed and fall back to a regex.
+        """
+        coord = points.get(point)
+        if coord is None:
+            x, y = POINT_PATTERN.search(point).groups()
+            coord = (int(x), int(y))
+        return coord
+        
     def _get_junctions(self) -> dict:
         """
         Returns the junctions in the given .ricepr file
         """
-        tree = ET.parse(self.PATH)
-        root = tree.getroot()
-        
-        junctions = {
-            "generating" : [],
-            "terminal" : [],
-            "primary" : [],
-            "secondary" : [],
-            "tertiary" : [],
-            "quaternary" : []
-        }
-        
-        for vertex in root.iter('vertex'):
-            x = int(vertex.attrib['x'])
-            y = int(vertex.attrib['y'])
-            type_ = vertex.attrib['type']
-            coord = tuple([x, y])
-            if type_ == "Generating":
-                junctions["generating"].append(coord)
-            elif type_ == "End":
-                junctions["terminal"].append(coord)
-            elif type_ == "Primary":
-                junctions["primary"].append(coord)
-            elif type_ == "Seconday":
-                junctions["secondary"].append(coord)
-            elif type_ == "Tertiary":
-                junctions["tertiary"].append(coord)
-                
+        coords, levels, _ = self._parse_ricepr()
+        junctions = {level: [] for level in LEVELS}
+        for coord, code in zip(map(tuple, coords.tolist()), levels.tolist()):
+            junctions[LEVELS[code]].append(coord)
         return junctions
     
     def _get_edges(self) -> list:
         """
         Returns the edges in the given .ricepr file. Edges are the lines connecting two junctions.
         """
-        tree = ET.parse(self.PATH)
-        root = tree.getroot()
-        
-        edges = []
-        for edge in root.iter('edge'):
-            vertex1 = edge.attrib['vertex1']
-            vertex2 = edge.attrib['vertex2']
-            
-            x1 = int(vertex1.split('=')[1].split(',')[0])
-            y1 = int(vertex1.split('=')[2].split(']')[0])
-            
-            x2 = int(vertex2.split('=')[1].split(',')[0])
-            y2 = int(vertex2.split('=')[2].split(']')[0])
-            
-            edge = tuple([x1, y1, x2, y2])
-            edges.append(edge)
-
-        return edges
+        return [tuple(edge) for edge in self._parse_ricepr()[2].tolist()]
 
     # These 3 functions below are placed here instead of inside Edges.py because
     # the info. from edges only is not enough, but we also need to incorporate info. from junctions
@@ -101,11 +140,8 @@ class riceprManager:
         """Returns grains in the format of (x1, y1, x2, y2)"""
         assert len(self.edges) > 0, "You need at least one edge to do this operation"
 
-        grains = list()
-        for edge in self.edges:
-            _, _, x2, y2 = edge
-            if (x2, y2) in self.junctions.return_terminal():
-                grains.append(edge)
+        is_grain = self.junctions.isin(self.edges.array[:, 2:], "terminal")
+        grains = [edge for edge, keep in zip(self.edges, is_grain) if keep]
         
         return grains
         
@@ -119,77 +155,47 @@ class riceprManager:
         # - If we connect the edges from the 2 points (start and end points), we only see the edges pass through primary, secondary and terminal (no tertiary and beyond)
         # - 
         
-        primary_branches = list()
+        # Child -> parent map, built once. The parent of a vertex is the first point of the first edge ending at it.
+        parent_of = dict()
+        for x1, y1, x2, y2 in self.edges:
+            parent_of.setdefault((x2, y2), (x1, y1))
+        stop_vertices = set(self.junctions.return_primary()) | set(self.junctions.return_generating())
         
-        def find_parent(vertex, parents=None) -> list:
-            """Use recursion to find the parent, vertex is (x, y)"""
-            if parents is None:
-                parents = [vertex]
-            
-            for edge in self.edges:
-                # If vertex is the second point of this edge
-                if vertex == edge[2:]:
-                    parent = edge[0:2]
-                    break
-
-            parents.append(parent)
-            vertex = parent
-
-            if vertex not in self.junctions.return_primary() and vertex not in self.junctions.return_generating():
-                return find_parent(vertex, parents)
-            else:
-                return parents
+        def find_parents(vertex) -> list:
+            """Walk up the tree, vertex is (x, y) -> [vertex, ..., primary junction or generating]"""
+            parents = [vertex]
+            visited = {vertex}
+            while True:
+                assert vertex in parent_of, f"No parent found for {vertex}"
+                vertex = parent_of[vertex]
+                parents.append(vertex)
+                if vertex in stop_vertices:
+                    return parents
+                assert vertex not in visited, f"Cycle found at {vertex}"
+                visited.add(vertex)
 
         # Inspect the family tree from end point (upwards) to primary junction -> parents = [endpoint, ..., primary junction]
-        family_tree = list()
-        for endpoint in self.junctions.return_terminal():
-            parents = find_parent(endpoint)
-            family_tree.append(parents)
+        family_tree = [find_parents(endpoint) for endpoint in self.junctions.return_terminal()]
         
         # There are some outlier cases where they are not primary branches. That is when an end point only has one parent that is a primary junction.
         # Clean family tree
         family_tree = [i for i in family_tree if len(i) > 2]
         
         # Identify which set of end points belongs to the same branch, and store them in `clusters`
-        root_nodes = list(set([tree[-1] for tree in family_tree]))
-        clusters = list()
-        for root_node in root_nodes:
-            candidates = [family_tree[i] for i in range(len(family_tree)) if family_tree[i][-1] == root_node]
-
-            # Classify and store inside `clusters` -> the problem is: given a nested list, find inner lists that have 2 mutual entries.
-            for i, inner1 in enumerate(candidates):  # inner1 is an 1D list of tuples
-                # Initialize a new empty list. A cluster is composed of different paths that all end up at the same primary junction.
-                cluster = list()
-                
-                # Check if visited
-                if len(clusters) > 0:
-                    if inner1 in [pathway for cluster in clusters for pathway in cluster]:
-                        continue
-                cluster.append(inner1)
-                
-                for inner2 in candidates[i + 1:]:  # inner2 is an 1D list of tuples
-                    if len(clusters) > 0:
-                        if inner2 in [pathway for cluster in clusters for pathway in cluster]:
-                            continue
-                    if len(set(inner1) & set(inner2)) >= 2:
-                        cluster.append(inner2)
-
-                clusters.append(cluster)
-
+        # Since every vertex has a single parent, two paths ending at the same primary junction share at least 2 vertices
+        # if and only if they go through the same child of that primary junction, i.e. path[-2].
+        # Hence, a cluster is keyed by (primary junction, path[-2]), in order of first appearance.
+        clusters = dict()  # {primary junction: {path[-2]: [endpoint, ...]}}
+        for path in family_tree:
+            clusters.setdefault(path[-1], dict()).setdefault(path[-2], list()).append(path[0])
+        
         # Take the furthest end point from the primary junction to be the tip of that branch
-        for cluster in clusters:
-            primary_junction = cluster[0][-1]
-            endpoints = [path[0] for path in cluster]
-
-            max_dist = - math.inf
-            furthest_endpoint = None
-            for endpoint in endpoints:
-                dist = math.dist(endpoint, primary_junction)
-                if dist > max_dist:
-                    max_dist = dist
-                    furthest_endpoint = endpoint
-
-            primary_branches.append([furthest_endpoint, primary_junction])
+        primary_branches = list()
+        root_nodes = list(set([tree[-1] for tree in family_tree]))
+        for primary_junction in root_nodes:
+            for endpoints in clusters[primary_junction].values():
+                furthest_endpoint = max(endpoints, key=lambda endpoint: math.dist(endpoint, primary_junction))  # First one on ties
+                primary_branches.append([furthest_endpoint, primary_junction])
                     
         # Format the return branches
         primary_branches = [tuple(coordinate for coordinates in branch for coordinate in coordinates) for branch in primary_branches]
@@ -201,11 +207,8 @@ class riceprManager:
         """Returns secondary branches in the format of (x1, y1, x2, y2)"""
         assert len(self.edges) > 0, "You need at least one edge to do this operation"
 
-        secondary_branches = list()
-        for edge in self.edges:
-            x1, y1, x2, y2 = edge
-            if (x1, y1) in self.junctions.return_secondary() and (x2, y2) in self.junctions.return_terminal():
-                secondary_branches.append(edge)
+        is_secondary_branch = self.junctions.isin(self.edges.array[:, :2], "secondary") & self.junctions.isin(self.edges.array[:, 2:], "terminal")
+        secondary_branches = [edge for edge, keep in zip(self.edges, is_secondary_branch) if keep]
                 
         return secondary_branches
         
\ No newline at end of file
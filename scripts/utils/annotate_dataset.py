@@ -0,0 +1,145 @@
+import os
+import io
+import time
+import argparse
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ..generate_annotations.AnnotationsGenerator import AnnotationsGenerator
+from ..generate_annotations.riceprCache import RICEPR_CACHE_DIR
+
+TARGETS = ["junctions", "grains"]
+
+
+def annotate_dataset(raw_dir: str, ricepr_dir: str, bbox_size, save_path_txt: str = None, save_path_img: str = None, skeleton_based=False, oriented_method=0, species=("African", "Asian"), num_workers=None, cache_dir=RICEPR_CACHE_DIR, target="junctions") -> dict:
+    """
+    A utils function to interact with *generate_annotations* module
+
+    This function generates the junction (or grain) annotations of every image in the dataset, with a process pool.
+    A file that fails is reported and skipped, it does not stop the run.
+
+    Args:
+        raw_dir (str): Parent dir of the original images, containing African/ and Asian/
+        ricepr_dir (str): Parent dir of the .ricepr files, containing African/ and Asian/
+        bbox_size (int, list): bounding box size, or several sizes generated in one pass per image.
+            With several sizes, the outputs of each size go to a <save_path>/<bbox_size>/ sub-directory.
+        save_path_txt (str, optional): the parent dir of the label files (img_name_junctions.txt). Defaults to None.
+        save_path_img (str, optional): the parent dir of the preview images (img_name_junctions.jpg). Defaults to None.
+        skeleton_based (bool, optional): Defaults to False.
+        oriented_method (int, optional): {0: HBB, 1: OBBv1, 2: OBBv2}. Defaults to 0.
+        species (tuple, optional): Species directories to process. Defaults to ("African", "Asian").
+        num_workers (int, optional): Number of processes. Defaults to None (number of CPUs).
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to RICEPR_CACHE_DIR.
+        target (str, optional): "junctions" or "grains" (img_name_grains.txt/.jpg, as ./grains2txt.py and ./grains2img.py).
+            bbox_size, skeleton_based and oriented_method only apply to junctions. Defaults to "junctions".
+
+    Returns:
+        dict: {"timings": {name: seconds}, "failures": {name: error message}}
+    """
+    assert oriented_method in [0, 1, 2], "Invalid oriented_method"
+    assert target in TARGETS, "Invalid target"
+    assert save_path_txt or save_path_img, "Nothing to save"
+
+    for save_path in [save_path_txt, save_path_img]:
+        if save_path:
+            os.makedirs(save_path, exist_ok=True)
+
+    tasks = list()
+    for species_name in species:
+        for original_img in sorted(os.listdir(f"{raw_dir}/{species_name}")):
+            if original_img.endswith(".jpg"):
+                name = original_img[:-len(".jpg")]
+                img_path = f"{raw_dir}/{species_name}/{original_img}"
+                ricepr_path = f"{ricepr_dir}/{species_name}/{name}.ricepr"
+                tasks.append(tuple([img_path, ricepr_path]))
+
+    bbox_sizes = list(bbox_size) if isinstance(bbox_size, (list, tuple)) else None
+    options = dict(
+        bbox_size=bbox_sizes[0] if bbox_sizes else bbox_size,
+        bbox_sizes=bbox_sizes,
+        save_path_txt=save_path_txt,
+        save_path_img=save_path_img,
+        skeleton_based=skeleton_based,
+        oriented_method=oriented_method,
+        cache_dir=cache_dir,
+        target=target,
+    )
+
+    print(f"==>> Annotating {len(tasks)} images with {num_workers or os.cpu_count()} workers")
+    timings, failures = dict(), dict()
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(_annotate, img_path, ricepr_path, **options) for img_path, ricepr_path in tasks]
+        for i, future in enumerate(as_completed(futures), start=1):
+            name, elapsed, error = future.result()
+            if error is None:
+                timings[name] = elapsed
+                print(f"==>> [{i}/{len(tasks)}] {name} - {elapsed:.2f}s")
+            else:
+                failures[name] = error
+                print(f"==>> [{i}/{len(tasks)}] {name} - FAILED: {error.splitlines()[-1]}")
+
+    print(f"==>> Annotated {len(timings)}/{len(tasks)} images in {time.perf_counter() - start:.2f}s")
+    for name, error in failures.items():
+        print(f"==>> Failed {name}:\n{error}")
+
+    return {"timings": timings, "failures": failures}
+
+
+def _annotate(img_path, ricepr_path, bbox_size, bbox_sizes, save_path_txt, save_path_img, skeleton_based, oriented_method, cache_dir, target) -> tuple:
+    """Worker: annotate one image. Returns (name, seconds, error message or None)"""
+    name = img_path.split("/")[-1][:-len(".jpg")]
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # Per-file logs would interleave between workers
+            generator = AnnotationsGenerator(img_path=img_path, ricepr_path=ricepr_path, bbox_size=bbox_size, cache_dir=cache_dir)
+            if target == "grains":
+                if save_path_img:
+                    generator.draw_grains(save_path=save_path_img)
+                if save_path_txt:
+                    generator.encode_grains(save_path=save_path_txt)
+            else:
+                generator.generate_junctions(
+                    save_path_img=save_path_img,
+                    show=False,
+                    skeleton_based=skeleton_based,
+                    oriented_method=oriented_method,
+                    save_path_txt=save_path_txt,
+                    bbox_sizes=bbox_sizes,
+                )
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+
+    return (name, time.perf_counter() - start, error)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate junction annotations for the whole dataset")
+    parser.add_argument("--raw-dir", default="data/raw")
+    parser.add_argument("--ricepr-dir", default="data/processed")
+    parser.add_argument("--target", choices=TARGETS, default="junctions")
+    parser.add_argument("--bbox-size", type=int, nargs="+", default=[30], help="Several sizes are generated in one pass per image")
+    parser.add_argument("--oriented-method", type=int, choices=[0, 1, 2], default=0, help="0: HBB, 1: OBBv1, 2: OBBv2")
+    parser.add_argument("--skeleton-based", action="store_true")
+    parser.add_argument("--save-path-txt", default="buffer")
+    parser.add_argument("--save-path-img", default=None)
+    parser.add_argument("--species", nargs="+", default=["African", "Asian"])
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--cache-dir", default=RICEPR_CACHE_DIR)
+    args = parser.parse_args()
+
+    annotate_dataset(
+        raw_dir=args.raw_dir,
+        ricepr_dir=args.ricepr_dir,
+        bbox_size=args.bbox_size[0] if len(args.bbox_size) == 1 else args.bbox_size,
+        save_path_txt=args.save_path_txt,
+        save_path_img=args.save_path_img,
+        skeleton_based=args.skeleton_based,
+        oriented_method=args.oriented_method,
+        species=args.species,
+        num_workers=args.num_workers,
+        cache_dir=args.cache_dir,
+        target=args.target,
+    )
@@ -0,0 +1,79 @@
+import os
+from functools import lru_cache
+from PIL import Image
+
+EXIF_ORIENTATION = 0x0112
+
+
+def image_size(img_path, exif_transpose=True) -> tuple:
+    """
+    A utils function to get the size of an image from its header, without decoding the pixels
+
+    Same size as `cv2.imread(img_path).shape[:2][::-1]`: cv2 applies the EXIF orientation,
+    so width and height are swapped for the transposed orientations (5 to 8).
+    The size is read once per process while the file keeps its mtime and size, then read again if it is rewritten.
+
+    Args:
+        img_path (str): image path
+        exif_transpose (bool, optional): apply the EXIF orientation. Defaults to True.
+            False gives the stored size, same as `PIL.Image.open(img_path).size`.
+
+    Returns:
+        tuple: (width, height)
+    """
+    stat = os.stat(img_path)
+    return _image_size(os.path.abspath(img_path), stat.st_mtime_ns, stat.st_size, exif_transpose)
+
+
+@lru_cache(maxsize=None)
+def _image_size(img_path, mtime_ns, size, exif_transpose) -> tuple:
+    with Image.open(img_path) as img:
+        width, height = img.size
+        if exif_transpose and img.getexif().get(EXIF_ORIENTATION, 1) in [5, 6, 7, 8]:
+            width, height = height, width
+
+    return width, height
+
+
+def group_by_size(img_paths) -> list:
+    """
+    Indices of the images that have the same size, for batched inference
+
+    Ultralytics letterboxes a batch of images with different sizes to a square, but a single image (or a batch of
+    images of the same size) to the smallest rectangle, so only same-size images can share a batch and still get
+    the detections of a single-image predict.
+
+    Args:
+        img_paths (list): image paths
+
+    Returns:
+        list: [[i, j, ...], ...] one list per size, in order of first appearance, indices in the given order
+    """
+    groups = dict()
+    for i, img_path in enumerate(img_paths):
+        groups.setdefault(image_size(img_path), list()).append(i)
+
+    return list(groups.values())
+
+
+def test():
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        img_path = f"{tmp_dir}/img.jpg"
+        Image.new("RGB", (64, 48)).save(img_path)
+        assert image_size(img_path) == (64, 48)
+        
+        # Rewritten in the same process, with the same mtime: the size still changes the key
+        mtime_ns = os.stat(img_path).st_mtime_ns
+        Image.new("RGB", (10, 10)).save(img_path)
+        os.utime(img_path, ns=(mtime_ns, mtime_ns))
+        assert image_size(img_path) == (10, 10)
+        
+        Image.new("RGB", (30, 20)).save(img_path)
+        assert image_size(img_path) == (30, 20) and image_size(img_path, exif_transpose=False) == (30, 20)
+        assert group_by_size([img_path, img_path]) == [[0, 1]]
+    print("All tests passed")
+
+
+if __name__ == "__main__":
+    test()
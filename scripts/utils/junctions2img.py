@@ -1,8 +1,9 @@
 import os
 from ..generate_annotations.AnnotationsGenerator import AnnotationsGenerator
+from ..generate_annotations.riceprCache import RICEPR_CACHE_DIR
 
 
-def junctions2img(img_path: str, ricepr_path: str, bbox_size: int, save_path: str, skeleton_based=False, oriented_method=0):
+def junctions2img(img_path: str, ricepr_path: str, bbox_size: int, save_path: str, skeleton_based=False, oriented_method=0, cache_dir=None):
     """
     A utils function to interact with *generate_annotations* module
     
@@ -12,8 +13,9 @@ def junctions2img(img_path: str, ricepr_path: str, bbox_size: int, save_path: st
         img_path (str): original image path
         ricepr_path (str): .ricepr path
         save_path (str): the parent dir. (file name will be img_name_junctions.jpg)
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to None.
     """
-    generator = AnnotationsGenerator(img_path, ricepr_path, bbox_size)
+    generator = AnnotationsGenerator(img_path, ricepr_path, bbox_size, cache_dir=cache_dir)
     generator.generate_junctions(
         save_path_img=save_path,
         show=False,
@@ -49,6 +51,7 @@ if __name__ == "__main__":
                 save_path=BUFFER_PATH,
                 skeleton_based=False,  # Change this if needed
                 oriented_method=1,  # Change this if needed
+                cache_dir=RICEPR_CACHE_DIR,
             )
             print()
             break  # Comment out if needed
@@ -65,6 +68,7 @@ if __name__ == "__main__":
                 save_path=BUFFER_PATH,
                 skeleton_based=False,  # Change this if needed
                 oriented_method=0,  # Change this if needed
+                cache_dir=RICEPR_CACHE_DIR,
             )
             print()
             break  # Comment out if needed
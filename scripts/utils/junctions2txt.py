@@ -1,8 +1,9 @@
 import os
 from ..generate_annotations.AnnotationsGenerator import AnnotationsGenerator
+from ..generate_annotations.riceprCache import RICEPR_CACHE_DIR
 
 
-def junctions2txt(img_path: str, ricepr_path: str, bbox_size:int, save_path_txt: str, skeleton_based=False, oriented_method=0):
+def junctions2txt(img_path: str, ricepr_path: str, bbox_size:int, save_path_txt: str, skeleton_based=False, oriented_method=0, cache_dir=None):
     """
     A utils function to interact with *generate_annotations* module
     
@@ -13,8 +14,9 @@ def junctions2txt(img_path: str, ricepr_path: str, bbox_size:int, save_path_txt:
         ricepr_path (str): .ricepr path
         save_path (str): the parent dir. (file name will be img_name_junctions.txt)
         remove_end_generating (bool, optional): Defaults to False.
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to None.
     """
-    generator = AnnotationsGenerator(img_path=img_path, ricepr_path=ricepr_path, bbox_size=bbox_size)
+    generator = AnnotationsGenerator(img_path=img_path, ricepr_path=ricepr_path, bbox_size=bbox_size, cache_dir=cache_dir)
     generator.generate_junctions(
         save_path_img=None,
         show=False,
@@ -51,6 +53,7 @@ if __name__ == "__main__":
                 save_path_txt=BUFFER_PATH,
                 skeleton_based=False,  # Change this as desired
                 oriented_method=0,  # Change this as desired
+                cache_dir=RICEPR_CACHE_DIR,
             )
             print()
             break  # Change this if needed
@@ -67,6 +70,7 @@ if __name__ == "__main__":
                 save_path_txt=BUFFER_PATH,
                 skeleton_based=False,  # Change this as desired
                 oriented_method=0,  # Change this as desired
+                cache_dir=RICEPR_CACHE_DIR,
             )
             print()
             break  # Change this if needed
@@ -0,0 +1,42 @@
+import os
+import shutil
+
+LINK_METHODS = ["hardlink", "symlink", "copy"]
+
+
+def link_file(src, dst, method="hardlink") -> str:
+    """
+    A utils function to put a file at `dst` without copying its content, when possible
+
+    Splits share the same raw images and only differ in labels, so images are linked instead of copied.
+    A hardlink falls back to a symlink (e.g. across file systems), and a symlink to a copy (e.g. not permitted).
+
+    Args:
+        src (str): source file path
+        dst (str): destination file path, replaced if it exists
+        method (str, optional): "hardlink", "symlink" or "copy". Defaults to "hardlink".
+
+    Returns:
+        str: the method that was used
+    """
+    assert method in LINK_METHODS, "Invalid method"
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if method == "hardlink":
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            method = "symlink"
+
+    if method == "symlink":
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return "symlink"
+        except OSError:
+            method = "copy"
+
+    shutil.copy(src, dst)
+    return "copy"
@@ -0,0 +1,47 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def nearest_neighbor(points) -> tuple:
+    """
+    A utils function to find the nearest neighbor of every point at once, using KD-trees
+
+    Same result as scanning every other point with a strict `<` on the Euclidean distance:
+        - points with the same coordinates are not neighbors of each other
+        - on ties, the first point in the given order wins
+
+    Args:
+        points (array-like): (N, 2) coordinates
+
+    Returns:
+        dist (np.ndarray): (N,) distance to the nearest neighbor, inf if there is none
+        index (np.ndarray): (N,) index of the nearest neighbor in `points`, -1 if there is none
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    num_points = len(points)
+    dist = np.full(num_points, np.inf)
+    index = np.full(num_points, -1, dtype=np.int64)
+
+    unique_points = np.unique(points, axis=0)
+    if len(unique_points) < 2:
+        return dist, index
+
+    # The second nearest unique point is the nearest one with different coordinates (the first one is the point itself)
+    radius = cKDTree(unique_points).query(points, k=2)[0][:, 1]
+
+    # Gather every point within that radius (ties and duplicates included), then keep the closest, lowest index
+    candidates = cKDTree(points).query_ball_point(points, r=radius * (1 + 1e-9))
+    rows = np.repeat(np.arange(num_points), [len(candidate) for candidate in candidates])
+    cols = np.concatenate(candidates).astype(np.int64)
+    squared_dist = ((points[rows] - points[cols]) ** 2).sum(axis=1)
+
+    is_other = squared_dist > 0
+    rows, cols, squared_dist = rows[is_other], cols[is_other], squared_dist[is_other]
+    order = np.lexsort((cols, squared_dist, rows))
+    rows, cols, squared_dist = rows[order], cols[order], squared_dist[order]
+    is_first = np.r_[True, rows[1:] != rows[:-1]]
+
+    index[rows[is_first]] = cols[is_first]
+    dist[rows[is_first]] = np.sqrt(squared_dist[is_first])
+
+    return dist, index
@@ -0,0 +1,55 @@
+import os
+import warnings
+import numpy as np
+
+NUM_FIELDS = {"HBB": 5, "OBB": 9}  # class_index + coordinates
+
+
+def read_labels(label_path, flag=None) -> np.ndarray:
+    """
+    A utils function to read a YOLO label file in one go
+
+    Args:
+        label_path (str): .txt file path, one box per line
+            HBB: (class_index x y w h)
+            OBB: (class_index x1 y1 x2 y2 x3 y3 x4 y4)
+        flag (str, optional): "HBB" or "OBB". Defaults to None (guessed from the first line).
+
+    Returns:
+        np.ndarray: (num_boxes, 5) or (num_boxes, 9) float64, normalized as in the file
+    """
+    with open(label_path, "r") as f:
+        text = f.read()
+
+    if flag is None:
+        fields = text.lstrip().split("\n", 1)[0].split()
+        num_fields = len(fields) if fields else NUM_FIELDS["HBB"]
+    else:
+        num_fields = NUM_FIELDS[flag]
+    assert num_fields in NUM_FIELDS.values(), f"Unknown label format in {label_path}"
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)  # Older NumPy only warns on values it cannot parse
+        try:
+            values = np.fromstring(text, sep=" ")
+        except DeprecationWarning:
+            raise ValueError(f"Invalid value in {label_path}")
+
+    assert values.size % num_fields == 0, f"Incomplete line in {label_path}"
+
+    return values.reshape(-1, num_fields)
+
+
+def read_labels_dir(label_dir, flag=None) -> dict:
+    """
+    Args:
+        label_dir (str): directory of .txt label files
+        flag (str, optional): "HBB" or "OBB". Defaults to None (guessed from each file).
+
+    Returns:
+        dict: {filename: labels} in `os.listdir()` order, see `read_labels()`
+    """
+    return {
+        filename: read_labels(f"{label_dir}/{filename}", flag)
+        for filename in os.listdir(label_dir) if filename.endswith(".txt")
+    }
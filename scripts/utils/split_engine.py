@@ -0,0 +1,288 @@
+"""
+Manifest-driven train/val splits
+
+The dataset is scanned once into a manifest (name, species, num_junctions, width, height per panicle), cached as a .csv file
+with the mtime of each source file, so that it is read again only for the panicles that were added or changed.
+Splits are then made from the manifest only, without parsing the dataset again:
+    - `stratified_split()`: one train/val split, stratified by species and junction-count bins
+    - `kfold_splits()`: k train/val splits, every panicle is in exactly one val set
+Both are deterministic for a given `random_state`. A split is saved as a small .json index of names (`save_index()`),
+and only turned into data/splits/<split>/ when needed (`materialize_index()`), as a manifest split by default.
+"""
+
+import os
+import io
+import json
+import random
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+from .image_size import image_size
+from .train_val_split import _process_files, _write_manifest
+from .link_file import LINK_METHODS
+from ..generate_annotations.riceprManager import riceprManager
+from ..generate_annotations.riceprCache import RICEPR_CACHE_DIR
+
+MANIFEST_PATH = "cache/manifest.csv"
+INDEX_DIR = "data/splits/index"
+NUM_BINS = 4  # Junction-count bins per species
+SOURCE_COLUMNS = ["name", "species", "img_mtime_ns", "ricepr_mtime_ns"]
+MANIFEST_COLUMNS = ["name", "species", "num_junctions", "width", "height", "img_mtime_ns", "ricepr_mtime_ns"]
+
+
+def build_manifest(raw_dir="data/raw", ricepr_dir="data/processed", species=("African", "Asian"), manifest_path=MANIFEST_PATH, refresh=False, cache_dir=RICEPR_CACHE_DIR) -> pd.DataFrame:
+    """
+    A utils function to list every panicle of the dataset with its properties, from one scan
+
+    The cached manifest keeps the mtime of each image and .ricepr file. It is reused as long as the same files are there
+    with the same mtimes; otherwise only the new or changed panicles are read again, and removed ones are dropped.
+
+    Args:
+        raw_dir (str, optional): Parent dir of the original images, containing African/ and Asian/. Defaults to "data/raw".
+        ricepr_dir (str, optional): Parent dir of the .ricepr files, containing African/ and Asian/. Defaults to "data/processed".
+        species (tuple, optional): Defaults to ("African", "Asian").
+        manifest_path (str, optional): cached manifest. Defaults to MANIFEST_PATH.
+        refresh (bool, optional): read every panicle again even if the manifest is up to date. Defaults to False.
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to RICEPR_CACHE_DIR.
+
+    Returns:
+        pd.DataFrame: columns name, species, num_junctions, width, height, img_mtime_ns, ricepr_mtime_ns, sorted by species then name
+    """
+    sources = list_sources(raw_dir, ricepr_dir, species)
+    
+    cached = None
+    if os.path.exists(manifest_path) and not refresh:
+        cached = pd.read_csv(manifest_path, dtype={"name": str, "species": str})
+        if list(cached.columns) == MANIFEST_COLUMNS and cached[SOURCE_COLUMNS].equals(sources[SOURCE_COLUMNS]):
+            return cached
+        cached = cached.set_index(SOURCE_COLUMNS) if set(MANIFEST_COLUMNS) <= set(cached.columns) else None
+
+    rows = list()
+    for name, species_name, img_mtime_ns, ricepr_mtime_ns in sources.itertuples(index=False):
+        key = tuple([name, species_name, img_mtime_ns, ricepr_mtime_ns])
+        if cached is not None and key in cached.index:  # Unchanged since the cached manifest
+            num_junctions, width, height = cached.loc[key, ["num_junctions", "width", "height"]]
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):  # riceprManager logs every file
+                junctions, _ = riceprManager(PATH=f"{ricepr_dir}/{species_name}/{name}.ricepr", cache_dir=cache_dir).read_ricepr()
+            num_junctions = len(junctions.return_junctions())
+            width, height = image_size(f"{raw_dir}/{species_name}/{name}.jpg")
+        rows.append(tuple([name, species_name, int(num_junctions), int(width), int(height), img_mtime_ns, ricepr_mtime_ns]))
+
+    manifest = pd.DataFrame(rows, columns=MANIFEST_COLUMNS)
+
+    if os.path.dirname(manifest_path):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    print(f"==>> Saving {manifest_path} ({len(manifest)} panicles)")
+    manifest.to_csv(manifest_path, index=False)
+
+    return manifest
+
+
+def list_sources(raw_dir, ricepr_dir, species) -> pd.DataFrame:
+    """Every panicle with both an image and a .ricepr file: columns name, species, img_mtime_ns, ricepr_mtime_ns, sorted by species then name"""
+    rows = list()
+    for species_name in species:
+        for original_img in sorted(os.listdir(f"{raw_dir}/{species_name}")):
+            name = original_img[:-len(".jpg")]
+            ricepr_path = f"{ricepr_dir}/{species_name}/{name}.ricepr"
+            if not original_img.endswith(".jpg") or not os.path.exists(ricepr_path):
+                continue
+            
+            img_mtime_ns = os.stat(f"{raw_dir}/{species_name}/{original_img}").st_mtime_ns
+            rows.append(tuple([name, species_name, img_mtime_ns, os.stat(ricepr_path).st_mtime_ns]))
+
+    return pd.DataFrame(rows, columns=SOURCE_COLUMNS).astype({"img_mtime_ns": np.int64, "ricepr_mtime_ns": np.int64})
+
+
+def stratify(manifest, num_bins=NUM_BINS) -> pd.Series:
+    """Stratum of each panicle: species and the quantile bin of its junction count within its species"""
+    strata = pd.Series("", index=manifest.index)
+    for species_name, group in manifest.groupby("species"):
+        edges = np.quantile(group["num_junctions"], np.linspace(0, 1, num_bins + 1)[1:-1])
+        bins = np.searchsorted(edges, group["num_junctions"], side="right")
+        strata[group.index] = [f"{species_name}_{b}" for b in bins]
+
+    return strata
+
+
+def stratified_split(manifest, val_size, random_state=42, num_bins=NUM_BINS) -> tuple:
+    """
+    One train/val split with the same val ratio in every stratum
+
+    Args:
+        manifest (pd.DataFrame): output of `build_manifest()`
+        val_size (float): 0. to 1.
+        random_state (int, optional): Defaults to 42.
+        num_bins (int, optional): junction-count bins per species. Defaults to NUM_BINS.
+
+    Returns:
+        train (list): names of the training set
+        val (list): names of the validation set
+    """
+    assert 0. <= val_size <= 1., "Invalid val_size"
+
+    rng = random.Random(random_state)  # Local, the global random state is left untouched
+    train, val = list(), list()
+    strata = stratify(manifest, num_bins)
+
+    for stratum in sorted(strata.unique()):
+        names = sorted(manifest["name"][strata == stratum])
+        rng.shuffle(names)
+        split_index = int(round(len(names) * val_size))
+        val += names[:split_index]
+        train += names[split_index:]
+
+    return train, val
+
+
+def kfold_splits(manifest, k=5, random_state=42, num_bins=NUM_BINS) -> list:
+    """
+    k train/val splits, stratified as `stratified_split()`
+
+    Panicles of each stratum are shuffled and dealt to the folds in turn, continuing from one stratum to the next,
+    so that the fold sizes differ by one at most.
+
+    Returns:
+        list: [(train, val), ...] one per fold
+    """
+    assert k >= 2, "Invalid k"
+
+    rng = random.Random(random_state)
+    folds = [list() for _ in range(k)]
+    strata = stratify(manifest, num_bins)
+
+    position = 0
+    for stratum in sorted(strata.unique()):
+        names = sorted(manifest["name"][strata == stratum])
+        rng.shuffle(names)
+        for name in names:
+            folds[position % k].append(name)
+            position += 1
+
+    return [(sum(folds[:i] + folds[i + 1:], []), folds[i]) for i in range(k)]
+
+
+def save_index(index_path, train, val) -> None:
+    """Save a split as {"train": [...], "val": [...]}"""
+    if os.path.dirname(index_path):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    print(f"==>> Saving {index_path} ({len(train)} train, {len(val)} val)")
+    with open(index_path, "w") as f:
+        json.dump({"train": list(train), "val": list(val)}, f, indent=4)
+
+
+def load_index(index_path) -> tuple:
+    """Returns (train, val) saved by `save_index()`"""
+    with open(index_path, "r") as f:
+        index = json.load(f)
+    return index["train"], index["val"]
+
+
+def materialize_index(index_path, save_dir, mode="junctions", materialize="manifest") -> None:
+    """
+    Turn an index into a split directory
+
+    Args:
+        index_path (str): output of `save_index()`
+        save_dir (str): e.g. data/splits/split1
+        mode (str, optional): "junctions" or "grains". Defaults to "junctions".
+        materialize (str, optional): "manifest", or "hardlink", "symlink", "copy", see `train_val_split()`. Defaults to "manifest".
+    """
+    assert mode in ["junctions", "grains"], "Invalid mode"
+    assert materialize in LINK_METHODS + ["manifest"], "Invalid materialize"
+    train, val = load_index(index_path)
+
+    if materialize == "manifest":
+        _write_manifest(mode=mode, val=val, train=train, save_dir=save_dir)
+    else:
+        for set_name in ["train", "val"]:
+            os.makedirs(f"{save_dir}/{set_name}/images", exist_ok=True)
+            os.makedirs(f"{save_dir}/{set_name}/labels", exist_ok=True)
+        _process_files(mode=mode, val=val, train=train, save_dir=save_dir, method=materialize)
+
+
+def test():
+    """Manifest rebuilt with the new values when an image or a .ricepr file changes, or a panicle is removed"""
+    import tempfile
+    from PIL import Image
+
+    def write_ricepr(path, num_junctions):
+        vertices = "".join(f'<vertex id="{i}" x="{10 * i}" y="{10 * i}" type="Primary" fixed="false"/>' for i in range(num_junctions))
+        with open(path, "w") as f:
+            f.write(f"<graph><vertices>{vertices}</vertices><edges></edges></graph>")
+
+    def touch_later(path):
+        """New mtime even on file systems with a coarse clock"""
+        mtime_ns = os.stat(path).st_mtime_ns + 10 ** 9
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw_dir, ricepr_dir, manifest_path = f"{tmp_dir}/raw", f"{tmp_dir}/processed", f"{tmp_dir}/manifest.csv"
+        for species_name in ["African", "Asian"]:
+            os.makedirs(f"{raw_dir}/{species_name}")
+            os.makedirs(f"{ricepr_dir}/{species_name}")
+            for i in range(4):
+                Image.new("RGB", (64, 48)).save(f"{raw_dir}/{species_name}/p{i}.jpg")
+                write_ricepr(f"{ricepr_dir}/{species_name}/p{i}.ricepr", 3 + i)
+
+        def build():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return build_manifest(raw_dir, ricepr_dir, manifest_path=manifest_path, cache_dir=None)
+
+        manifest = build()
+        assert len(manifest) == 8 and manifest["num_junctions"].tolist() == [3, 4, 5, 6] * 2
+        assert build().equals(manifest)
+
+        # Image rewritten with another size, in the same process
+        Image.new("RGB", (10, 10)).save(f"{raw_dir}/Asian/p0.jpg")
+        touch_later(f"{raw_dir}/Asian/p0.jpg")
+        manifest = build()
+        p0 = manifest[(manifest["species"] == "Asian") & (manifest["name"] == "p0")]
+        assert p0[["width", "height"]].values.tolist() == [[10, 10]]
+        assert (manifest[manifest["name"] != "p0"][["width", "height"]].values == [64, 48]).all()
+
+        # .ricepr file changed, panicle removed
+        write_ricepr(f"{ricepr_dir}/African/p1.ricepr", 9)
+        touch_later(f"{ricepr_dir}/African/p1.ricepr")
+        os.remove(f"{raw_dir}/African/p3.jpg")
+        manifest = build()
+        assert len(manifest) == 7 and "p3" not in manifest[manifest["species"] == "African"]["name"].tolist()
+        assert manifest[(manifest["species"] == "African") & (manifest["name"] == "p1")]["num_junctions"].tolist() == [9]
+        assert pd.read_csv(manifest_path)[["width", "height"]].values.tolist() == manifest[["width", "height"]].values.tolist()
+
+        # Splits cover every panicle once
+        train, val = stratified_split(manifest, 0.5)
+        assert sorted(train + val) == sorted(manifest["name"]) and stratified_split(manifest, 0.5) == (train, val)
+        folds = kfold_splits(manifest, k=3)
+        assert sorted(sum([val for _, val in folds], [])) == sorted(manifest["name"])
+    print("All tests passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Make stratified train/val index files from the dataset manifest")
+    parser.add_argument("--raw-dir", default="data/raw")
+    parser.add_argument("--ricepr-dir", default="data/processed")
+    parser.add_argument("--refresh", action="store_true", help="Read every panicle again, even if the manifest is up to date")
+    parser.add_argument("--val-size", type=float, default=0.3)
+    parser.add_argument("--k", type=int, default=None, help="k-fold cross-validation instead of one split")
+    parser.add_argument("--num-bins", type=int, default=NUM_BINS)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--name", default="stratified", help="Index files are <index-dir>/<name>.json or <name>_fold<i>.json")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--test", action="store_true", help="Run the self-test and exit")
+    args = parser.parse_args()
+
+    if args.test:
+        test()
+        raise SystemExit
+
+    manifest = build_manifest(raw_dir=args.raw_dir, ricepr_dir=args.ricepr_dir, refresh=args.refresh)
+
+    if args.k is None:
+        train, val = stratified_split(manifest, args.val_size, args.random_state, args.num_bins)
+        save_index(f"{args.index_dir}/{args.name}.json", train, val)
+    else:
+        for i, (train, val) in enumerate(kfold_splits(manifest, args.k, args.random_state, args.num_bins)):
+            save_index(f"{args.index_dir}/{args.name}_fold{i}.json", train, val)
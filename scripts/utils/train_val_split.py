@@ -1,13 +1,16 @@
 import os
 import random
 import shutil
+from .link_file import link_file, LINK_METHODS
 
+CLASS_NAMES = {"junctions": "junction", "grains": "grain"}  # data.yaml names of the manifest splits
 
-def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, random_state: int = 42, shuffle: bool = True):
+
+def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, random_state: int = 42, shuffle: bool = True, materialize: str = "hardlink"):
     """
     Split the dataset from data/annotations to train and dev sets inside data/splits
     
-    Method: Combine + Shuffle + Split + Copy
+    Method: Combine + Shuffle + Split + Copy (labels) and Link (images)
 
     Args:
         mode (str): "junctions" or "grains" or "all"
@@ -16,6 +19,9 @@ def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, ra
         val_size (float): 0. to 1.
         random_state (int): Defaults to 42.
         shuffle (bool): Defaults to True.
+        materialize (str): How images are put in save_dir. Defaults to "hardlink".
+            "hardlink", "symlink" or "copy": train/ and val/ with images/ and labels/, see ../utils/link_file.py.
+            "manifest": no image is linked nor copied, only labels/ and an Ultralytics file list data.yaml, see `_write_manifest()`.
     
     Returns:
         train (list): List of filenames for the training set.
@@ -23,6 +29,7 @@ def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, ra
     """
     assert mode in ["junctions", "grains", "all"], "Invalid mode"
     assert 0. <= val_size <= 1., "Invalid test_size"
+    assert materialize in LINK_METHODS + ["manifest"], "Invalid materialize"
     
     african_path = root_dir + "/African"
     asian_path = root_dir + "/Asian"
@@ -39,10 +46,9 @@ def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, ra
             name = file_name[:-len("_junctions.jpg")]
             rice_panicles.append(name)
            
-    # Shuffle 
-    random.seed(random_state)
+    # Shuffle, with a local random state (same order as seeding the global one)
     if shuffle:
-        random.shuffle(rice_panicles)
+        random.Random(random_state).shuffle(rice_panicles)
     
     # Split
     split_index = int(len(rice_panicles) * val_size)
@@ -50,10 +56,12 @@ def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, ra
     train = rice_panicles[split_index:]
     
     # Move
+    process_files = _write_manifest if materialize == "manifest" else _process_files
+    options = dict() if materialize == "manifest" else dict(method=materialize)
     if mode == "junctions":
-        _process_files(mode="junctions", val=val, train=train, save_dir=save_dir)
+        process_files(mode="junctions", val=val, train=train, save_dir=save_dir, **options)
     elif mode == "grains":
-        _process_files(mode="grains", val=val, train=train, save_dir=save_dir)
+        process_files(mode="grains", val=val, train=train, save_dir=save_dir, **options)
     elif mode == "all":
         # Ongoing
         ...
@@ -62,8 +70,8 @@ def train_val_split(mode: str, root_dir: str, save_dir: str, val_size: float, ra
 
     
 # NOTE: instead of copying from `african_annotations_path` as before, now copying from `buffer/`
-def _process_files(mode: str, val: list, train: list, save_dir: str):
-    """Copy (and rename) src file from root_dir to save_dir"""
+def _process_files(mode: str, val: list, train: list, save_dir: str, method: str = "hardlink"):
+    """Copy (and rename) label files, and link images from root_dir to save_dir"""
     assert mode in ["junctions", "grains", "all"], "Invalid mode"
     postfix = f"_{mode}"
     
@@ -83,7 +91,7 @@ def _process_files(mode: str, val: list, train: list, save_dir: str):
             label_src = asian_annotations_path + "/" + file_name + postfix + ".txt"
             image_dst = save_dir + "/" + "val/images/" + file_name + ".jpg"
             label_dst = save_dir + "/" + "val/labels/" + file_name + ".txt" 
-        shutil.copy(image_src, image_dst)
+        link_file(image_src, image_dst, method)
         shutil.copy(label_src, label_dst)
             
     for file_name in train:
@@ -97,10 +105,54 @@ def _process_files(mode: str, val: list, train: list, save_dir: str):
             label_src = asian_annotations_path + "/" + file_name + postfix + ".txt"
             image_dst = save_dir + "/" + "train/images/" + file_name + ".jpg"
             label_dst = save_dir + "/" + "train/labels/" + file_name + ".txt" 
-        shutil.copy(image_src, image_dst)
+        link_file(image_src, image_dst, method)
         shutil.copy(label_src, label_dst)
 
 
+def _write_manifest(mode: str, val: list, train: list, save_dir: str):
+    """
+    Write a split as file lists pointing at the raw images, instead of linking or copying them
+    
+    save_dir/
+    ├── images/African -> data/raw/African  # one symlink per species
+    ├── images/Asian -> data/raw/Asian
+    ├── labels/African/*.txt                # Ultralytics reads the labels of images/<species>/x.jpg from labels/<species>/x.txt
+    ├── labels/Asian/*.txt
+    ├── train.txt                           # ./images/<species>/x.jpg per line
+    ├── val.txt
+    └── data.yaml
+    
+    N.B. Tools that read data/splits/<split>/{train,val}/images (e.g. F1score) need a materialized split.
+    """
+    assert mode in ["junctions", "grains", "all"], "Invalid mode"
+    postfix = f"_{mode}"
+    
+    for species in ["African", "Asian"]:
+        os.makedirs(f"{save_dir}/images", exist_ok=True)
+        os.makedirs(f"{save_dir}/labels/{species}", exist_ok=True)
+        if not os.path.lexists(f"{save_dir}/images/{species}"):
+            os.symlink(os.path.abspath(f"data/raw/{species}"), f"{save_dir}/images/{species}", target_is_directory=True)
+    
+    for set_name, file_names in [("val", val), ("train", train)]:
+        lines = list()
+        for file_name in file_names:
+            species = "African" if os.path.exists(f"data/raw/African/{file_name}.jpg") else "Asian"
+            shutil.copy(f"data/annotations/{species}/{file_name}{postfix}.txt", f"{save_dir}/labels/{species}/{file_name}.txt")
+            lines.append(f"./images/{species}/{file_name}.jpg")
+            
+        with open(f"{save_dir}/{set_name}.txt", "w") as f:
+            f.write("\n".join(lines) + "\n")
+            
+    print(f"==>> Saving {save_dir}/data.yaml")
+    with open(f"{save_dir}/data.yaml", "w") as f:
+        f.write(f"path: {os.path.abspath(save_dir)}\n")
+        f.write("train: train.txt\n")
+        f.write("val: val.txt\n")
+        f.write("\n")
+        f.write("names:\n")
+        f.write(f"  0: {CLASS_NAMES[mode]}\n")
+
+
 if __name__ == "__main__":
     mode = "junctions"
     split_name = "split2"  # Change this if needed
@@ -1,5 +1,6 @@
 from .plot_loss import plot_loss
 from .predict_show import predict_show
+from ..compute_metrics.PredictionCache import PREDICTION_CACHE_DIR
 
 class Visualizer:
     def __init__(self) -> None:
@@ -12,7 +13,7 @@ class Visualizer:
         plot_loss(csv_file, save_path)
         print("==>> Visualizer finished plotting losses.")
         
-    def predict_show(self, img_path, checkpoint, conf):
-        predict_show(img_path, checkpoint, conf)                
+    def predict_show(self, img_path, checkpoint, conf, cache_dir=PREDICTION_CACHE_DIR):
+        predict_show(img_path, checkpoint, conf, cache_dir)                
         print("==>> Visualizer finished visualizing.")
         
\ No newline at end of file
@@ -1,9 +1,13 @@
 import cv2
+import numpy as np
 from ultralytics import YOLO
 from matplotlib import pyplot as plt
+from ..compute_metrics.PredictionCache import PredictionCache
 
+BOX_COLOR = (255, 42, 4)  # BGR, color of class 0 in ultralytics plots
 
-def predict_show(img_path, checkpoint, conf):
+
+def predict_show(img_path, checkpoint, conf, cache_dir=None):
     """
     This function shows a yolo prediction image with some extra info.
     
@@ -11,27 +15,44 @@ def predict_show(img_path, checkpoint, conf):
         img_path (str): image path
         checkpoint (str): model path
         conf (float): confidence cutoff
+        cache_dir (str): prediction cache directory, e.g. `PREDICTION_CACHE_DIR`. Defaults to None (always run the model).
+            With a cache, boxes are drawn from the cached arrays and the model is only loaded if the image is not cached yet.
     """
-    # Inference
-    model = YOLO(checkpoint)
+    if cache_dir is None:
+        # Inference
+        model = YOLO(checkpoint)
 
-    results = model.predict(source=img_path, conf=conf)
-    result = results[0]
-    
-    if result.boxes is not None:
-        num_pred = len(result.boxes)  
-        flag = "HBB"
-    else: 
-        num_pred = len(result.obb)
-        flag = "OBB"
+        results = model.predict(source=img_path, conf=conf)
+        result = results[0]
+        
+        if result.boxes is not None:
+            num_pred = len(result.boxes)  
+            flag = "HBB"
+        else: 
+            num_pred = len(result.obb)
+            flag = "OBB"
 
-    # Plotting config.
-    pred_img = result.plot(
-        line_width=2,
-        conf=False,
-        labels=False,
-        # font_size=10.,
-    )
+        # Plotting config.
+        pred_img = result.plot(
+            line_width=2,
+            conf=False,
+            labels=False,
+            # font_size=10.,
+        )
+    else:
+        prediction = next(PredictionCache(checkpoint, cache_dir).predict([img_path], conf))
+        num_pred = len(prediction.conf)
+        flag = "HBB" if prediction.task == "detect" else "OBB"
+        
+        pred_img = cv2.imread(img_path)
+        if flag == "HBB":
+            for x, y, w, h in prediction.xywh:
+                pt1 = (int(x - w / 2), int(y - h / 2))
+                pt2 = (int(x + w / 2), int(y + h / 2))
+                cv2.rectangle(pred_img, pt1, pt2, BOX_COLOR, 2)
+        else:
+            corners = np.intp(prediction.xyxyxyxy.reshape(-1, 4, 2))
+            cv2.polylines(pred_img, list(corners), isClosed=True, color=BOX_COLOR, thickness=2)
     
     pred_img = cv2.cvtColor(pred_img, cv2.COLOR_BGR2RGB)
 
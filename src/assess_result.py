@@ -2,6 +2,8 @@ import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from scripts.compute_metrics.F1score import F1score
+from scripts.compute_metrics.PredictionCache import PREDICTION_CACHE_DIR
+from scripts.compute_metrics.parallel_evaluation import evaluate_splits
 import yaml
 
 
@@ -15,6 +17,29 @@ def assess_result(split_name, mode, conf, iou_threshold=0.1):
     f1score.compute_save_f1_score()
 
 
+def assess_results(split_names, confidence, iou_threshold=0.1, modes=("train", "val"), num_workers=None):
+    """
+    Same as `assess_result()` for several splits and modes at once, evaluated concurrently by a process pool
+
+    Args:
+        split_names (list): e.g. ["split1", "split2"]
+        confidence (dict): {split_name: [train conf, val conf]}, as in config.yaml
+        iou_threshold (float, optional): Defaults to 0.1.
+        modes (tuple, optional): Defaults to ("train", "val").
+        num_workers (int, optional): number of processes. Defaults to None (number of CPUs).
+    """
+    jobs = [
+        tuple([split_name, mode, confidence[split_name][0] if mode == "train" else confidence[split_name][1], iou_threshold])
+        for split_name in split_names for mode in modes
+    ]
+    histories = evaluate_splits(jobs, num_workers=num_workers, cache_dir=PREDICTION_CACHE_DIR)
+
+    for split_name, mode, conf, iou_threshold in jobs:
+        f1score = F1score(split_name=split_name, mode=mode, conf=conf, iou_threshold=iou_threshold)
+        f1score.save_history(histories[(split_name, mode)])
+        f1score.save_f1_score()
+
+
 if __name__ == "__main__":
     with open("src/config.yaml", "r") as f:
         config = yaml.safe_load(f)
@@ -31,3 +56,6 @@ if __name__ == "__main__":
     # [1] Murrugarra-Llerena et al. (2022). Can we trust bounding box annotations for object detection?. CVPR (pp. 4813-4822).
 
     assess_result(split_name, mode, conf, iou_threshold)
+    
+    # Every split in config.yaml at once, on all CPUs
+    # assess_results(list(confidence.keys()), confidence, iou_threshold)
@@ -10,10 +10,15 @@ MOTIVATION:
 import sys
 import os
 import numpy as np
+from scipy.spatial import cKDTree
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import math
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
 from scripts.generate_annotations.AnnotationsGenerator import AnnotationsGenerator
+from scripts.generate_annotations.riceprManager import riceprManager
+from scripts.generate_annotations.riceprCache import RICEPR_CACHE_DIR
+from scripts.utils.read_labels import read_labels
+from scripts.utils.image_size import image_size
+from scripts.utils.nearest_neighbor import nearest_neighbor
 import matplotlib.pyplot as plt
 
 
@@ -80,6 +85,17 @@ def check_overlapping(split_path: str, percentage: float = 20) -> float:
     return overlapping_degree
         
 
+def check_overlapping_splits(split_paths: list, percentage: float = 20, num_workers=None) -> list:
+    """
+    `check_overlapping()` of several splits, one process per split
+
+    Returns:
+        list: The overlapping degree of each split, in the given order
+    """
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(check_overlapping, split_paths, [percentage] * len(split_paths)))
+        
+
 def check_overlapping_for_single_image(img_name, img_dir_path, label_dir_path, percentage) -> tuple:
     """Check overlapping degree (%) for a SINGLE IMAGE, at ONE SIZE"""
     # Variables that store important info
@@ -89,65 +105,204 @@ def check_overlapping_for_single_image(img_name, img_dir_path, label_dir_path, p
     # Get image path
     img_path = img_dir_path + f"/{img_name}"
 
-    # Get image size
-    raw_img = Image.open(img_path)
-    width, height = raw_img.size
+    # Get image size, from the header only
+    width, height = image_size(img_path, exif_transpose=False)
 
     # Get label path
     label_path = label_dir_path + f"/{img_name[:-len('.jpg')]}.txt"
-    with open(label_path, "r") as file:
-        boxes = [[float(value) for value in line.split()] for line in file]  # covert every value to float
+    labels = read_labels(label_path, "HBB")  # (class_index x y w h) per row
 
     # Increment num_boxes with the number of bounding boxes in an image (A)
-    num_boxes = len(boxes)
+    num_boxes = len(labels)
 
-    # Reshape boxes
-    for i in range(len(boxes)):
-        boxes[i][1] = round(boxes[i][1] * width)
-        boxes[i][2] = round(boxes[i][2] * height)
-        boxes[i][3] = round(boxes[i][3] * width)
-        boxes[i][4] = round(boxes[i][4] * height)
+    # Reshape boxes, rounding half to even like round()
+    boxes = np.rint(labels[:, 1:] * [width, height, width, height]).astype(np.int64)
 
     # Because the width and height are the same for every box, extract that info
-    box_width, box_height = boxes[0][3], boxes[0][4]
+    box_width, box_height = boxes[0, 2], boxes[0, 3]
         
     # Change the way boxes are represented
-    boxes = [[box[1], box[2]] for box in boxes]
-
-    # Inspect each box if it overlaps with one other box
-    for box in boxes:
-        # Get box properties
-        x1, y1 = box
-        
-        # Find the closest box
-        x2, y2 = closest_box(x1, y1, boxes)
+    boxes = boxes[:, :2]
 
-        # Increment num_overlapping by 1 if it overlaps
-        if is_overlapping(x1, y1, x2, y2, box_width, box_height, percentage):
-            num_overlapping += 1
+    # Find the closest box of every box at once
+    _, index = nearest_neighbor(boxes)
+    has_neighbor = index >= 0  # False if every box has the same coordinates
+    
+    # Count the boxes that overlap with their closest box
+    x1, y1 = boxes[has_neighbor].T
+    x2, y2 = boxes[index[has_neighbor]].T
+    num_overlapping = int(np.count_nonzero(is_overlapping(x1, y1, x2, y2, box_width, box_height, percentage)))
 
     return (num_boxes, num_overlapping)
 
 
-def closest_box(x1, y1, boxes) -> tuple:
-    """Return the closest box."""
-    min_dist = float('inf')
-    closest_box = None
+def overlap_curve(bbox_sizes: list, percentage: float = 20, ricepr_dir: str = "data/processed", species=("African", "Asian"), cache_dir=RICEPR_CACHE_DIR) -> dict:
+    """
+    Overlapping degree (%) of the whole dataset at EVERY SIZE, straight from the junctions of the .ricepr files
+    
+    Same degrees as `check_overlapping()` on HBB splits annotated at each size, without writing the splits or reading the images:
+    the closest box of a box does not depend on the size, so it is found once per image and every size is tested at once.
+
+    Args:
+        bbox_sizes (list): Bounding box sizes (pixels)
+        percentage (float, optional): Overlapping threshold, see `check_overlapping()`. Defaults to 20.
+        ricepr_dir (str, optional): Parent dir of the .ricepr files, containing African/ and Asian/. Defaults to "data/processed".
+        species (tuple, optional): Defaults to ("African", "Asian").
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to RICEPR_CACHE_DIR.
+
+    Returns:
+        dict: {
+            "bbox_size": (num_sizes,),
+            "overlapping_degree": (num_sizes,) in the range of [0%, 100%],
+            "first_derivative", "second_derivative", "third_derivative": (num_sizes,) successive `np.gradient()` over the sizes
+        }
+    """
+    assert 0 <= percentage <= 100, "Percentage must fall within [0, 100]"
     
-    for x2, y2 in boxes:
-        if (x2, y2) == (x1, y1):
-            continue
+    bbox_sizes = np.asarray(bbox_sizes, dtype=np.int64)
+    num_boxes_in_total = 0
+    num_overlapping_in_total = np.zeros(len(bbox_sizes), dtype=np.int64)
+    
+    for centers in junction_centers(ricepr_dir, species, cache_dir):
+        num_boxes_in_total += len(centers)
+        num_overlapping_in_total += count_overlapping(centers, bbox_sizes, percentage)
+            
+    # Compute the overlapping degree
+    overlapping_degree = num_overlapping_in_total / num_boxes_in_total * 100
+    
+    # Logging out useful info
+    print(f"==>> A total of {num_boxes_in_total} objects have been inspected at {len(bbox_sizes)} sizes.")
+    
+    first_derivative = np.gradient(overlapping_degree, bbox_sizes)
+    second_derivative = np.gradient(first_derivative, bbox_sizes)
+    third_derivative = np.gradient(second_derivative, bbox_sizes)
+    
+    return {
+        "bbox_size": bbox_sizes,
+        "overlapping_degree": overlapping_degree,
+        "first_derivative": first_derivative,
+        "second_derivative": second_derivative,
+        "third_derivative": third_derivative,
+    }
+
+
+def overlap_pairs(bbox_sizes: list, percentage: float = 20, ricepr_dir: str = "data/processed", species=("African", "Asian"), cache_dir=RICEPR_CACHE_DIR) -> dict:
+    """
+    Every overlapping pair of boxes of the whole dataset at EVERY SIZE, not only each box and its closest box
+    
+    A box can overlap several boxes, which `overlap_curve()` counts once at most. Here all pairs are found by one KD-tree query per image,
+    within the largest size in the Chebyshev distance (two boxes can only overlap if both |dx| and |dy| are below it),
+    then every size is tested at once with `is_overlapping()`. Boxes with the same center are counted as a pair.
+
+    Args:
+        bbox_sizes (list): Bounding box sizes (pixels)
+        percentage (float, optional): Overlapping threshold, see `check_overlapping()`. Defaults to 20.
+        ricepr_dir (str, optional): Parent dir of the .ricepr files, containing African/ and Asian/. Defaults to "data/processed".
+        species (tuple, optional): Defaults to ("African", "Asian").
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to RICEPR_CACHE_DIR.
+
+    Returns:
+        dict: {
+            "bbox_size": (num_sizes,),
+            "num_boxes": number of boxes in the whole dataset,
+            "overlapping_degree": (num_sizes,) percentage of boxes that overlap with at least one other box,
+            "num_pairs": (num_sizes,) number of overlapping pairs,
+            "overlap_counts": (num_sizes, max_count + 1) number of boxes that overlap with exactly 0, 1, 2, ... other boxes,
+            "ious": [(num_pairs,), ...] IoU of every overlapping pair, one array per size
+        }
+    """
+    assert 0 <= percentage <= 100, "Percentage must fall within [0, 100]"
+    
+    bbox_sizes = np.asarray(bbox_sizes, dtype=np.int64)
+    num_boxes_in_total = 0
+    counts, ious = list(), list()
+    
+    for centers in junction_centers(ricepr_dir, species, cache_dir):
+        num_boxes_in_total += len(centers)
+        image_counts, image_ious = find_overlapping_pairs(centers, bbox_sizes, percentage)
+        counts.append(image_counts)
+        ious.append(image_ious)
+    
+    counts = np.concatenate(counts, axis=1) if counts else np.zeros((len(bbox_sizes), 0), dtype=np.int64)
+    overlap_counts = np.zeros((len(bbox_sizes), counts.max(initial=0) + 1), dtype=np.int64)
+    for k in range(len(bbox_sizes)):
+        overlap_counts[k] = np.bincount(counts[k], minlength=overlap_counts.shape[1])
+    ious = [np.concatenate([image_ious[k] for image_ious in ious]) if ious else np.zeros(0) for k in range(len(bbox_sizes))]
+    
+    # Logging out useful info
+    print(f"==>> A total of {num_boxes_in_total} objects have been inspected at {len(bbox_sizes)} sizes.")
+    
+    return {
+        "bbox_size": bbox_sizes,
+        "num_boxes": num_boxes_in_total,
+        "overlapping_degree": (counts > 0).sum(axis=1) / max(num_boxes_in_total, 1) * 100,
+        "num_pairs": np.array([len(iou) for iou in ious], dtype=np.int64),
+        "overlap_counts": overlap_counts,
+        "ious": ious,
+    }
+
+
+def find_overlapping_pairs(centers, bbox_sizes, percentage) -> tuple:
+    """
+    Every overlapping pair of boxes in a SINGLE IMAGE, at EVERY SIZE
+
+    Returns:
+        counts (np.ndarray): (num_sizes, num_boxes) number of other boxes each box overlaps with
+        ious (list): [(num_pairs,), ...] IoU of every overlapping pair, one array per size
+    """
+    centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+    bbox_sizes = np.asarray(bbox_sizes, dtype=np.int64).reshape(-1, 1)
+    
+    # Candidate pairs (i < j): |dx| and |dy| both within 2 * (box_size // 2), the widest overlap at the largest size
+    max_extent = 2 * int(bbox_sizes.max(initial=0) // 2)
+    pairs = cKDTree(centers).query_pairs(r=max_extent, p=np.inf, output_type="ndarray") if len(centers) > 1 else np.zeros((0, 2), dtype=np.int64)
+    
+    x1, y1 = centers[pairs[:, 0]].T
+    x2, y2 = centers[pairs[:, 1]].T
+    is_overlapped = is_overlapping(x1, y1, x2, y2, bbox_sizes, bbox_sizes, percentage)  # (num_sizes, num_pairs)
+    
+    # Overlapping area of each pair, as in `is_overlapping()`
+    dx, dy = np.abs(x1 - x2), np.abs(y1 - y2)
+    area_overlap = np.clip(2 * (bbox_sizes // 2) - dx, 0, None) * np.clip(2 * (bbox_sizes // 2) - dy, 0, None)
+    box_area = bbox_sizes * bbox_sizes
+    iou = area_overlap / (2 * box_area - area_overlap)
+    
+    counts = np.zeros((len(bbox_sizes), len(centers)), dtype=np.int64)
+    ious = list()
+    for k in range(len(bbox_sizes)):
+        counts[k] = np.bincount(pairs[is_overlapped[k]].ravel(), minlength=len(centers))
+        ious.append(iou[k, is_overlapped[k]])
         
-        dist = math.dist((x1, y1), (x2, y2))
-        if dist < min_dist:
-            min_dist = dist
-            closest_box = (x2, y2)
+    return counts, ious
+
+
+def junction_centers(ricepr_dir, species, cache_dir):
+    """Yield the HBB centers (N, 2) of every .ricepr file, i.e. its junctions as in `AnnotationsGenerator.generate_junctions()`"""
+    for species_name in species:
+        for file_name in sorted(os.listdir(f"{ricepr_dir}/{species_name}")):
+            if not file_name.endswith(".ricepr"):
+                continue
+            
+            junctions, _ = riceprManager(PATH=f"{ricepr_dir}/{species_name}/{file_name}", cache_dir=cache_dir).read_ricepr()
+            yield np.asarray(junctions.return_junctions(), dtype=np.int64).reshape(-1, 2)
+
+
+def count_overlapping(centers, bbox_sizes, percentage) -> np.ndarray:
+    """Number of boxes that overlap with their closest box in a SINGLE IMAGE, at EVERY SIZE (num_sizes,)"""
+    centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+    bbox_sizes = np.asarray(bbox_sizes, dtype=np.int64).reshape(-1, 1)
+    
+    _, index = nearest_neighbor(centers)
+    has_neighbor = index >= 0
     
-    return closest_box
+    x1, y1 = centers[has_neighbor].T
+    x2, y2 = centers[index[has_neighbor]].T
+    
+    return np.count_nonzero(is_overlapping(x1, y1, x2, y2, bbox_sizes, bbox_sizes, percentage), axis=1)
 
 
-def is_overlapping(x_a, y_a, x_b, y_b, box_width, box_height, percentage) -> bool:
-    """Returns True if box_a overlaps with box_b"""
+def is_overlapping(x_a, y_a, x_b, y_b, box_width, box_height, percentage):
+    """Returns True if box_a overlaps with box_b, elementwise if the coordinates are arrays"""
     # Create representations for 2 boxes as (x1, y1, x2, y2) with (x1, y1) being the left corner and (x2, y2) being the right corner
     x1_a, y1_a = x_a - box_width // 2, y_a - box_height // 2
     x2_a, y2_a = x_a + box_width // 2, y_a + box_height // 2
@@ -156,12 +311,8 @@ def is_overlapping(x_a, y_a, x_b, y_b, box_width, box_height, percentage) -> boo
     x2_b, y2_b = x_b + box_width // 2, y_b + box_height // 2
     
     # Compute the overlapping region
-    x1_overlap, y1_overlap = max(x1_a, x1_b), max(y1_a, y1_b)
-    x2_overlap, y2_overlap = min(x2_a, x2_b), min(y2_a, y2_b)
-    
-    # If x1_overlap >= x2_overlap or y1_overlap >= y2_overlap, the boxes do not overlap
-    if x1_overlap >= x2_overlap or y1_overlap >= y2_overlap:
-        return False
+    x1_overlap, y1_overlap = np.maximum(x1_a, x1_b), np.maximum(y1_a, y1_b)
+    x2_overlap, y2_overlap = np.minimum(x2_a, x2_b), np.minimum(y2_a, y2_b)
     
     # Compute the overlapping area, which is the number of overlapping pixels
     area_overlap = (x2_overlap - x1_overlap) * (y2_overlap - y1_overlap)
@@ -169,7 +320,8 @@ def is_overlapping(x_a, y_a, x_b, y_b, box_width, box_height, percentage) -> boo
     # Compute overlap percentage
     overlap_percentage = area_overlap / (box_width * box_height) * 100
     
-    return overlap_percentage >= percentage
+    # If x1_overlap >= x2_overlap or y1_overlap >= y2_overlap, the boxes do not overlap
+    return (x1_overlap < x2_overlap) & (y1_overlap < y2_overlap) & (overlap_percentage >= percentage)
 
 
 def show_annotated_images(image_name, bbox_size) -> None:
@@ -180,7 +332,8 @@ def show_annotated_images(image_name, bbox_size) -> None:
     gen = AnnotationsGenerator(
         img_path=img_path,
         ricepr_path=ricepr_path,
-        bbox_size=bbox_size
+        bbox_size=bbox_size,
+        cache_dir=RICEPR_CACHE_DIR,
     )
     
     gen.generate_junctions(show=True, oriented_method=0)
@@ -192,17 +345,19 @@ if __name__ == "__main__":
     MIN_SIZE, MAX_SIZE, STEP = 22, 98, 4 * SPLIT_STEP  # Change the first two as needed
     PERCENTAGE = 20  # Change this if needed
 
-    SPLIT_INDEX = list(range(1, NUM_SPLITS+1, SPLIT_STEP))
-    history = list()
-
-    for i in SPLIT_INDEX:
-        split_path = f"data/splits/split{i}"
-        overlapping_degree = check_overlapping(
-            split_path=split_path,
-            percentage=PERCENTAGE
-        )
-        
-        history.append(overlapping_degree)
+    # Every size is computed from the .ricepr files at once, no split needed
+    curve = overlap_curve(
+        bbox_sizes=list(range(MIN_SIZE, MAX_SIZE+1, STEP)),
+        percentage=PERCENTAGE,
+    )
+    history = curve["overlapping_degree"].tolist()
+    
+    # Or, from the annotated splits (data/splits/split1/, split2/, ...), checked concurrently
+    # SPLIT_INDEX = list(range(1, NUM_SPLITS+1, SPLIT_STEP))
+    # history = check_overlapping_splits(
+    #     split_paths=[f"data/splits/split{i}" for i in SPLIT_INDEX],
+    #     percentage=PERCENTAGE,
+    # )
     
     print(f"==>> History: {history}")
     
@@ -224,7 +379,7 @@ if __name__ == "__main__":
     
     # First derivative
     plt.figure(figsize=(12, 8))
-    slopes = np.gradient(history, x_values)
+    slopes = curve["first_derivative"]
     plt.scatter(x_values, slopes, c="red", zorder=2)
     plt.plot(x_values, slopes, label='First derivative',zorder=1)
     plt.xlabel('Bounding box size (pixels)')
@@ -233,7 +388,7 @@ if __name__ == "__main__":
 
     # Second derivative
     plt.figure(figsize=(12, 8))
-    second_slopes = np.gradient(slopes, x_values)
+    second_slopes = curve["second_derivative"]
     plt.scatter(x_values, second_slopes, c="red", zorder=2)
     plt.plot(x_values, second_slopes, label='Second derivative',zorder=1)
 
@@ -244,7 +399,7 @@ if __name__ == "__main__":
 
     # Third derivative
     plt.figure(figsize=(12, 8))
-    third_slopes = np.gradient(second_slopes, x_values)
+    third_slopes = curve["third_derivative"]
     plt.scatter(x_values, third_slopes, c="red", zorder=2)
     plt.plot(x_values, third_slopes, label='Third derivative',zorder=1)
 
@@ -254,6 +409,14 @@ if __name__ == "__main__":
     plt.xticks(np.arange(MIN_SIZE, MAX_SIZE + 1, STEP))
     plt.show()
     
+    # Every overlapping pair, not only the closest box
+    # pairs = overlap_pairs(
+    #     bbox_sizes=list(range(MIN_SIZE, MAX_SIZE+1, STEP)),
+    #     percentage=PERCENTAGE,
+    # )
+    # print(f"==>> Overlapping pairs: {pairs['num_pairs'].tolist()}")
+    # print(f"==>> Boxes overlapping 0, 1, 2, ... others: {pairs['overlap_counts'].tolist()}")
+    
     # For debugging purposes
     # show_annotated_images(
     #     image_name="10_2_2_1_2_DSC00195",
@@ -3,10 +3,11 @@ import os
 import numpy as np
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from scripts.generate_annotations.AnnotationsGenerator import AnnotationsGenerator
+from scripts.generate_annotations.riceprCache import RICEPR_CACHE_DIR
 import matplotlib.pyplot as plt
 
 
-def compute_junction_distance(root_img_dir, root_ricepr_dir, histogram=False, percentile: int = None, mu_std=False, median_absolute_dev=None, tallest_bin=False, distance_threshold=None):
+def compute_junction_distance(root_img_dir, root_ricepr_dir, histogram=False, percentile: int = None, mu_std=False, median_absolute_dev=None, tallest_bin=False, distance_threshold=None, cache_dir=None):
     """
     Compute the distance between junctions and returns a histogram (optional)
     the distance between junctions excludes the distance from one junction to end point
@@ -16,6 +17,7 @@ def compute_junction_distance(root_img_dir, root_ricepr_dir, histogram=False, pe
         root_ricepr_dir (str): The root ricepr directory, consisting of African/ and Asian/
         histogram (bool, optional): Defaults to False.
         distance_threshold (tuple, optional): Removing any junction distance beyond this threshold
+        cache_dir (str, optional): parsed .ricepr cache directory. Defaults to None.
     """
     # Create a buffer to store all distance
     buffer = list()
@@ -31,7 +33,8 @@ def compute_junction_distance(root_img_dir, root_ricepr_dir, histogram=False, pe
         # Create a generator
         gen = AnnotationsGenerator(
             img_path=img_path,
-            ricepr_path=ricepr_path
+            ricepr_path=ricepr_path,
+            cache_dir=cache_dir,
         )
         
         # Get junction distance
@@ -55,7 +58,8 @@ def compute_junction_distance(root_img_dir, root_ricepr_dir, histogram=False, pe
         # Create a generator
         gen = AnnotationsGenerator(
             img_path=img_path,
-            ricepr_path=ricepr_path
+            ricepr_path=ricepr_path,
+            cache_dir=cache_dir,
         )
         
         # Get junction distance
@@ -150,5 +154,6 @@ if __name__ == "__main__":
         mu_std=False,
         median_absolute_dev=True,
         tallest_bin=False,
-        distance_threshold=(11, 25)
+        distance_threshold=(11, 25),
+        cache_dir=RICEPR_CACHE_DIR,
     )
\ No newline at end of file
@@ -1,5 +1,8 @@
+import sys
 import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import xml.etree.ElementTree as ET
+from scripts.utils.read_labels import read_labels_dir
 
 
 def compute_num_objects(root_dir="data/processed"):
@@ -43,22 +46,18 @@ def compute_num_objects(root_dir="data/processed"):
 
 def compute_num_objects_training_set(split_path):
     """Compute the number of objects in a training dataset (70% of original dataset)"""
-    train_path = split_path + "/train/labels"
-    val_path = split_path + "/val/labels"
+    train_labels = read_labels_dir(split_path + "/train/labels")
+    val_labels = read_labels_dir(split_path + "/val/labels")
     counter = 0
     
-    for filename in os.listdir(train_path):
-        file_path = train_path + "/" + filename
-        with open(file_path) as f:
-            counter += len(f.readlines())
+    for labels in train_labels.values():
+        counter += len(labels)
         
-    for filename in os.listdir(val_path):
-        file_path = val_path + "/" + filename
-        with open(file_path) as f:
-            counter += len(f.readlines())
+    for labels in val_labels.values():
+        counter += len(labels)
     
     num_obj = counter
-    obj_aver = counter / (len(os.listdir(train_path)) + len(os.listdir(val_path)))
+    obj_aver = counter / (len(train_labels) + len(val_labels))
     
     return num_obj, obj_aver
 
@@ -1,26 +1,39 @@
+import sys
 import os 
 import shutil
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.utils.link_file import link_file
 
 
-def duplicate_split(src, dst):
+def duplicate_split(src, dst, method="hardlink", mode="junctions"):
     """
     Duplicate a split dataset: same images but different labels
 
     Args:
         src (str): src split name
         dst (str): dst split name
+        method (str, optional): "hardlink", "symlink" or "copy" for the images, see scripts/utils/link_file.py. Defaults to "hardlink".
+        mode (str, optional): annotation type, i.e. the buffer/ labels are <img_name>_<mode>.txt, as in `train_val_split()`. Defaults to "junctions".
         
     N.B. Only run this function after the buffer is ready. The buffer is buffer/. Ready means buffer/ contains all and only labels files. To do that, refer to scripts/utils and run those files as modules. For example: python -m scripts.utils.junction2txt
+    N.B. A manifest split (see `_write_manifest()` in scripts/utils/train_val_split.py) is duplicated as a manifest split.
     """
+    if os.path.exists(f"data/splits/{src}/train.txt"):
+        duplicate_manifest_split(src, dst, mode)
+        return
+    
     os.makedirs(f"data/splits/{dst}/train/images", exist_ok=True)
     os.makedirs(f"data/splits/{dst}/train/labels", exist_ok=True)
     os.makedirs(f"data/splits/{dst}/val/images", exist_ok=True)
     os.makedirs(f"data/splits/{dst}/val/labels", exist_ok=True)
     
     buffer = "buffer"
+    postfix = f"_{mode}.txt"
 
     for filename in os.listdir(buffer):
-        new_filename = filename.replace("_junctions.txt", ".txt")  # Rename
+        if not filename.endswith(postfix):
+            continue
+        new_filename = filename[:-len(postfix)] + ".txt"  # Rename
         img_name = new_filename.replace(".txt", ".jpg")
         
         # Labels
@@ -29,11 +42,11 @@ def duplicate_split(src, dst):
         if os.path.exists(f"data/splits/{src}/val/labels/{new_filename}"):
             shutil.copy(f"{buffer}/{filename}", f"data/splits/{dst}/val/labels/{new_filename}")
 
-        # Images
+        # Images, linked instead of copied
         if os.path.exists(f"data/splits/{src}/train/images/{img_name}"):
-            shutil.copy(f"data/splits/{src}/train/images/{img_name}", f"data/splits/{dst}/train/images/{img_name}")
+            link_file(f"data/splits/{src}/train/images/{img_name}", f"data/splits/{dst}/train/images/{img_name}", method)
         if os.path.exists(f"data/splits/{src}/val/images/{img_name}"):
-            shutil.copy(f"data/splits/{src}/val/images/{img_name}", f"data/splits/{dst}/val/images/{img_name}")
+            link_file(f"data/splits/{src}/val/images/{img_name}", f"data/splits/{dst}/val/images/{img_name}", method)
         
     # Copy and modify the data.yaml file
     yaml_src = f"data/splits/{src}/data.yaml"
@@ -53,6 +66,36 @@ def duplicate_split(src, dst):
         print(f"data.yaml not found in {yaml_src}")
         
         
+def duplicate_manifest_split(src, dst, mode="junctions"):
+    """Same as `duplicate_split()` for a manifest split: file lists and image symlinks are reused, only labels are written"""
+    buffer = "buffer"
+    postfix = f"_{mode}.txt"
+
+    for species in ["African", "Asian"]:
+        os.makedirs(f"data/splits/{dst}/images", exist_ok=True)
+        os.makedirs(f"data/splits/{dst}/labels/{species}", exist_ok=True)
+        if os.path.lexists(f"data/splits/{src}/images/{species}") and not os.path.lexists(f"data/splits/{dst}/images/{species}"):
+            os.symlink(os.path.realpath(f"data/splits/{src}/images/{species}"), f"data/splits/{dst}/images/{species}", target_is_directory=True)
+
+    for set_name in ["train", "val"]:
+        shutil.copy(f"data/splits/{src}/{set_name}.txt", f"data/splits/{dst}/{set_name}.txt")
+
+        # Labels, ./images/<species>/x.jpg -> labels/<species>/x.txt
+        with open(f"data/splits/{src}/{set_name}.txt", "r") as f:
+            for line in f.read().split():
+                _, _, species, img_name = line.split("/")
+                filename = img_name[:-len(".jpg")] + postfix
+                if os.path.exists(f"{buffer}/{filename}"):
+                    shutil.copy(f"{buffer}/{filename}", f"data/splits/{dst}/labels/{species}/{img_name.replace('.jpg', '.txt')}")
+
+    # Copy and modify the data.yaml file
+    with open(f"data/splits/{src}/data.yaml", 'r') as file:
+        content = file.read()
+
+    with open(f"data/splits/{dst}/data.yaml", 'w') as file:
+        file.write(content.replace(f"data/splits/{src}", f"data/splits/{dst}"))
+        
+        
 if __name__ == "__main__":
     src = "split1"  # Change this if needed
     dst = "split11"  # Change this if needed
@@ -3,6 +3,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import matplotlib.pyplot as plt
 import pandas as pd
+from scripts.compute_metrics.ResultsStore import ResultsStore, RESULTS_STORE_PATH
 
 
 def plot_optimal_bbox(train=True, val=True):
@@ -20,7 +21,7 @@ def plot_optimal_bbox(train=True, val=True):
     bbox_sizes = list(range(MIN_SIZE, MAX_SIZE+1, STEP))
     split_names = [f"split{n}" for n in range(1, NUM_SPLITS+1)]
     
-    f1_train, pr_train, rc_train, f1_val, pr_val, rc_val = read_xlsx(split_names)
+    f1_train, pr_train, rc_train, f1_val, pr_val, rc_val = read_results(split_names)
     assert len(bbox_sizes) == len(f1_train), "Unmatched list lengths"
 
     # Set global font size, marker size, and line width
@@ -82,6 +83,23 @@ def plot_optimal_bbox(train=True, val=True):
 
 
 
+def read_results(split_names: list):
+    """Mean metrics of the latest run of each split, from logs/results.sqlite, or from the xlsx file of each split and mode that is not there"""
+    metrics = dict()
+    for mode in ["train", "val"]:
+        df = ResultsStore().mean_metrics(split_names, mode) if os.path.exists(RESULTS_STORE_PATH) else pd.DataFrame()
+        for split_name in split_names:
+            if split_name not in df.index:  # Not in the store for this mode only
+                xlsx_df = pd.read_excel(f"logs/{split_name}/{mode}/f1_score.xlsx")
+                df.loc[split_name, ["f1", "precision", "recall"]] = xlsx_df[["f1", "precision", "recall"]].mean().values
+        metrics[mode] = df.loc[split_names]
+    
+    f1_train, pr_train, rc_train = metrics["train"]["f1"].tolist(), metrics["train"]["precision"].tolist(), metrics["train"]["recall"].tolist()
+    f1_val, pr_val, rc_val = metrics["val"]["f1"].tolist(), metrics["val"]["precision"].tolist(), metrics["val"]["recall"].tolist()
+        
+    return f1_train, pr_train, rc_train, f1_val, pr_val, rc_val
+
+
 def read_xlsx(split_names: list):
     f1_train, pr_train, rc_train, f1_val, pr_val, rc_val = [], [], [], [], [], []
     
@@ -109,7 +127,7 @@ def plot_fixed_bbox_comparison(fixed_bbox_size: int):
     split_names = ['split1', 'split2', 'split3']
     
     # Retrieve metrics
-    f1_train, pr_train, rc_train, f1_val, pr_val, rc_val = read_xlsx(split_names)
+    f1_train, pr_train, rc_train, f1_val, pr_val, rc_val = read_results(split_names)
     
     # Define colors for each metric
     metric_colors = {'F1': 'tomato', 'Precision': 'mediumseagreen', 'Recall': 'royalblue'}
@@ -0,0 +1,44 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from scripts.compute_metrics.F1score import F1score
+import yaml
+
+
+def tune_confidence(split_names, iou_threshold=0.3):
+    """
+    Find the confidence that maximizes the mean F1 score of each split, with one inference pass per split and mode
+
+    Args:
+        split_names (list): e.g. ["split1", "split2"]
+        iou_threshold (float, optional): IoU threshold used in `assess_result.py`. Defaults to 0.3.
+
+    Returns:
+        dict: {split_name: [train conf, val conf]}, same format as `confidence` in config.yaml
+    """
+    confidence = dict()
+    
+    for split_name in split_names:
+        confidence[split_name] = list()
+        for mode in ["train", "val"]:
+            f1score = F1score(split_name=split_name, mode=mode, conf=None)
+            sweep = f1score.sweep_confidence(iou_thresholds=[iou_threshold])
+            confidence[split_name].append(sweep["optimal_conf"][iou_threshold])
+    
+    return confidence
+
+
+if __name__ == "__main__":
+    with open("src/config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+    
+    # HYPERPARAMETERS (USER-DEFINED | CHANGE IF STATIC)
+    split_names = list(config["confidence"].keys())  # Splits in config.yaml
+    iou_threshold = 0.3  # static | Same as assess_result.py
+    
+    confidence = tune_confidence(split_names, iou_threshold)
+    
+    # Paste into config.yaml
+    print("confidence: # [train conf, val conf]")
+    for split_name, (train_conf, val_conf) in confidence.items():
+        print(f"  {split_name}: [{train_conf:.3f}, {val_conf:.3f}]")